@@ -1,13 +1,26 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
+import json
+import threading
+import time
+import uuid
+from contextlib import ExitStack
 import cv2
 import numpy as np
 import pandas as pd
 import tensorflow as tf
+import torch
 import mediapipe as mp
 from ultralytics import YOLO
-
+import metrics
+from model_registry import ModelRegistry
+from model_config import MOVENET_MODEL, YOLO_MODEL, MEDIAPIPE_OPTIONS, WINDOW_SIZE
+from keypoint_buffer import KeypointBuffer
+from job_queue import JobQueue, JOB_WORKERS
+from workspace import create_workspace, workspace_dir
+from video_decoder import ThreadedDecoder, decode_frames
+from resumable_upload import UploadError, UploadStore
 
 
 app = Flask(__name__)
@@ -17,276 +30,532 @@ CORS(app)
 UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-WINDOW_SIZE = 60
+VIDEO_ID = 1  # כי זה וידאו אחד
+
+MIN_X, MAX_X = -1, 1
+MIN_Y, MAX_Y = -1, 1
+
+MOVENET_KEYPOINTS = [5, 6, 7, 8, 11, 12, 13, 14]
+YOLO_KEYPOINTS = {
+    "left_shoulder": 5, "right_shoulder": 6, "left_elbow": 7, "right_elbow": 8,
+    "left_hip": 11, "right_hip": 12, "left_knee": 13, "right_knee": 14
+}
+MEDIAPIPE_KEYPOINTS = [11, 12, 13, 14, 23, 24, 25, 26]
+
+OUTPUT_CSV = {
+    "movenet": "movenet_motion_dataset_with_window_scores.csv",
+    "yolo": "yolo_motion_dataset_with_window_scores.csv",
+    "mediapipe": "mediapipe_motion_dataset_with_window_scores.csv"
+}
+OUTPUT_ENCODING = {
+    "movenet": None,
+    "yolo": "utf-8-sig",
+    "mediapipe": None
+}
+
+
+def normalize_data(value, min_val, max_val):
+    return (value - min_val) / (max_val - min_val)
+
+# Every backend writes the raw (x, y, confidence) of its eight selected joints
+# for a frame into one row of a KeypointBuffer. Scaling, normalisation and the
+# per-backend column names are applied once per video in keypoint_table().
+
+# Threads each backend may use inside one process (None = library default).
+# Parallel extraction sets this per worker so the backends do not
+# oversubscribe each other's cores.
+INFERENCE_THREADS = None
+
+def set_inference_threads(n):
+    global INFERENCE_THREADS
+    INFERENCE_THREADS = n
+    cv2.setNumThreads(n)
+    torch.set_num_threads(n)
 
 # ---------- MoveNet ----------
-def process_movenet(video_path):
-    interpreter = tf.lite.Interpreter(model_path="models/thunder3.tflite")
+def load_movenet():
+    interpreter = tf.lite.Interpreter(model_path=MOVENET_MODEL, num_threads=INFERENCE_THREADS)
     interpreter.allocate_tensors()
+    return interpreter
 
-    def normalize_data(value, min_val, max_val):
-        return (value - min_val) / (max_val - min_val)
-
-    selected_keypoints = [5, 6, 7, 8, 11, 12, 13, 14]
-    MIN_X, MAX_X = -1, 1
-    MIN_Y, MAX_Y = -1, 1
-    WINDOW_SIZE = 60
-    dataset = []
-
-    video_id = 1  # כי זה וידאו אחד
-    cap = cv2.VideoCapture(video_path)
-    prev_keypoints = None
-    prev_velocity = None
-    prev_time = None
-    frame_index = 0
-    time_windows_data = {}
-    current_window_index = 0
-
-    time_windows_data[current_window_index] = {
-        "start_frame": 0,
-        "end_frame": WINDOW_SIZE - 1,
-        "video_id": video_id,
-        "left_shoulder_confidences": [],
-        "right_shoulder_confidences": [],
-        "left_elbow_confidences": [],
-        "right_elbow_confidences": [],
-        "left_hip_confidences": [],
-        "right_hip_confidences": [],
-        "left_knee_confidences": [],
-        "right_knee_confidences": []
-    }
+def movenet_entry(interpreter, frame, out):
+    input_tensor = cv2.resize(frame, (256, 256))
+    input_tensor = np.expand_dims(input_tensor.astype(np.float32), axis=0)
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        if frame_index >= (current_window_index + 1) * WINDOW_SIZE:
-            current_window_index += 1
-            time_windows_data[current_window_index] = {
-                "start_frame": current_window_index * WINDOW_SIZE,
-                "end_frame": (current_window_index + 1) * WINDOW_SIZE - 1,
-                "video_id": video_id,
-                "left_shoulder_confidences": [],
-                "right_shoulder_confidences": [],
-                "left_elbow_confidences": [],
-                "right_elbow_confidences": [],
-                "left_hip_confidences": [],
-                "right_hip_confidences": [],
-                "left_knee_confidences": [],
-                "right_knee_confidences": []
-            }
+    interpreter.set_tensor(interpreter.get_input_details()[0]['index'], input_tensor)
+    interpreter.invoke()
+    keypoints_with_scores = interpreter.get_tensor(interpreter.get_output_details()[0]['index'])
+
+    out[:] = keypoints_with_scores[0, 0, MOVENET_KEYPOINTS, :]
+    return True
 
-        input_tensor = cv2.resize(frame, (256, 256))
-        input_tensor = np.expand_dims(input_tensor.astype(np.float32), axis=0)
+def movenet_columns(keypoints, width, height, scale):
+    xy = keypoints[:, :, :2] * np.array([width, height], dtype=np.float32)
+    x = normalize_data(xy[:, :, 0], MIN_X, MAX_X)
+    y = normalize_data(xy[:, :, 1], MIN_Y, MAX_Y)
 
-        interpreter.set_tensor(interpreter.get_input_details()[0]['index'], input_tensor)
-        interpreter.invoke()
-        keypoints_with_scores = interpreter.get_tensor(interpreter.get_output_details()[0]['index'])
+    columns = {}
+    for j, i in enumerate(MOVENET_KEYPOINTS):
+        columns[f"keypoint_{i}_x"] = x[:, j]
+        columns[f"keypoint_{i}_y"] = y[:, j]
+        columns[f"keypoint_{i}_confidence"] = keypoints[:, j, 2]
+    return "window_index", columns
 
-        keypoints = keypoints_with_scores[0, 0, :, :2]
-        scores = keypoints_with_scores[0, 0, :, 2]
+# ---------- YOLO ----------
+def load_yolo():
+    return YOLO(YOLO_MODEL)
+
+def yolo_entry(model, frame, out):
+    results = model(frame, verbose=False)
+    if not results or len(results[0].keypoints) == 0:
+        return False
 
-        height, width, _ = frame.shape
-        keypoints = keypoints * np.array([width, height])
-        current_time = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+    out[:] = results[0].keypoints.data[0].cpu().numpy()[list(YOLO_KEYPOINTS.values())]
+    return True
 
+def yolo_batch_entries(model, frames, out):
+    """Run YOLO once over a list of frames, filling out[b] for each frame.
 
-        if prev_keypoints is not None and prev_time is not None:
-            time_diff = current_time - prev_time
+    Returns a boolean mask of the frames in which a person was detected.
+    """
+    results = model(frames, verbose=False)
+
+    joint_indices = list(YOLO_KEYPOINTS.values())
+    detected = np.zeros(len(frames), dtype=bool)
+    for b, result in enumerate(results):
+        if len(result.keypoints) == 0:
+            continue
+        out[b] = result.keypoints.data[0].cpu().numpy()[joint_indices]
+        detected[b] = True
+    return detected
+
+def yolo_columns(keypoints, width, height, scale):
+    # YOLO reports pixel coordinates of the frame it was given, which is what
+    # the GRU was trained on; undo any downscaling before inference.
+    xy = keypoints[:, :, :2] / np.float32(scale)
+    columns = {}
+    for j, name in enumerate(YOLO_KEYPOINTS):
+        columns[f"{name}_x"] = xy[:, j, 0]
+        columns[f"{name}_y"] = xy[:, j, 1]
+        columns[f"{name}_conf"] = keypoints[:, j, 2]
+    return "window_index", columns
 
-        data_entry = {
-            "video_id": video_id,
-            "frame": frame_index,
-            "window_index": current_window_index
+# ---------- MediaPipe ----------
+def load_mediapipe():
+    return mp.solutions.pose.Pose(**MEDIAPIPE_OPTIONS)
+
+def mediapipe_entry(pose, frame, out):
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    results = pose.process(frame_rgb)
+    if not results.pose_landmarks:
+        return False
+
+    keypoints = results.pose_landmarks.landmark
+    for j, i in enumerate(MEDIAPIPE_KEYPOINTS):
+        kp = keypoints[i]
+        out[j] = (kp.x, kp.y, kp.visibility)
+    return True
+
+def mediapipe_columns(keypoints, width, height, scale):
+    xy = keypoints[:, :, :2] * np.array([width, height], dtype=np.float32)
+    x = normalize_data(xy[:, :, 0], MIN_X, MAX_X)
+    y = normalize_data(xy[:, :, 1], MIN_Y, MAX_Y)
+
+    columns = {}
+    for j, i in enumerate(MEDIAPIPE_KEYPOINTS):
+        columns[f"keypoint_{i}_x"] = x[:, j]
+        columns[f"keypoint_{i}_y"] = y[:, j]
+        columns[f"keypoint_{i}_confidence"] = keypoints[:, j, 2]
+    return "chunk_index", columns
+
+
+BACKENDS = {
+    "movenet": (load_movenet, movenet_entry),
+    "yolo": (load_yolo, yolo_entry),
+    "mediapipe": (load_mediapipe, mediapipe_entry)
+}
+BACKEND_COLUMNS = {
+    "movenet": movenet_columns,
+    "yolo": yolo_columns,
+    "mediapipe": mediapipe_columns
+}
+N_JOINTS = 8
+
+# Backends that can run several frames per call. The batch size trades memory
+# (one decoded frame per slot) for less per-call overhead.
+BATCH_ENTRIES = {
+    "yolo": yolo_batch_entries
+}
+YOLO_BATCH_SIZE = 16
+# Largest ?yolo_batch= accepted from a request; every frame of a batch is
+# held in memory until the batch has run.
+MAX_YOLO_BATCH = 64
+
+# Sampling: run the pose models on TARGET_FPS frames per second of video
+# (None = every decoded frame) and resize frames by DOWNSCALE before inference
+# (None = full resolution). Frame numbers and window ids always refer to the
+# source video, so the backends and the ensemble line up whatever the setting;
+# the ensemble interpolates sampled rows back to every frame before it builds
+# its sequences (sequences.source_rate).
+TARGET_FPS = None
+DOWNSCALE = None
+
+# Run each backend in its own pinned process (see parallel_extraction.py)
+# instead of one after the other on every frame.
+PARALLEL_EXTRACTION = False
+
+# Decode on a background thread (video_decoder.ThreadedDecoder) so decoding
+# overlaps with inference.
+THREADED_DECODE = True
+
+WARMUP_FRAME = np.zeros((256, 256, 3), dtype=np.uint8)
+
+# None of the backends is safe to share between threads, so the registry keeps
+# one warm instance per concurrent worker. MediaPipe tracks across frames and
+# is reset before it is handed to the next video.
+registry = ModelRegistry()
+for _name, (_loader, _entry) in BACKENDS.items():
+    registry.register(
+        _name,
+        _loader,
+        warmup=lambda model, entry=_entry: entry(model, WARMUP_FRAME, np.zeros((N_JOINTS, 3), dtype=np.float32)),
+        reset=(lambda pose: pose.reset()) if _name == "mediapipe" else None
+    )
+
+def keypoint_table(name, buffer, width, height, scale=1.0):
+    """Build the extractor DataFrame for one backend from its buffer.
+
+    `width` and `height` are those of the source video; `scale` is the factor
+    the frames were resized by before inference.
+    """
+    frames, keypoints = buffer.data()
+    window_column, columns = BACKEND_COLUMNS[name](keypoints, width, height, scale)
+
+    table = {
+        "video_id": np.full(len(frames), VIDEO_ID, dtype=np.int32),
+        "frame": frames,
+        window_column: frames // WINDOW_SIZE
+    }
+    table.update(columns)
+    return pd.DataFrame(table)
+
+def feature_rows(name, keypoints, width, height, scale=1.0):
+    """(frames, 24) float32 GRU features, in keypoint_store.FEATURE_COLUMNS order.
+
+    All three backends list their joints in the same order, so the x, y and
+    confidence columns of keypoint_table() map one-to-one onto the features.
+    """
+    _, columns = BACKEND_COLUMNS[name](keypoints, width, height, scale)
+    return np.stack(list(columns.values()), axis=1).astype(np.float32)
+
+# ---------- Single-decode extraction ----------
+def record_inference(name, seconds, frames, totals):
+    """Per-frame inference metrics; `totals` accumulates [seconds, frames] for the video."""
+    metrics.timed_frames(name, seconds, frames)
+    totals[0] += seconds
+    totals[1] += frames
+
+def record_throughput(name, seconds, frames):
+    if seconds:
+        metrics.backend_fps.set(frames / seconds, backend=name)
+
+def sample_frames(video_path, target_fps=TARGET_FPS, downscale=DOWNSCALE, threaded=THREADED_DECODE):
+    """Yield (frame_index, frame, (width, height), timestamp_ms) for every sampled frame.
+
+    See video_decoder.decode_frames; with `threaded` the frames are decoded
+    ahead on a background thread while the backends run.
+    """
+    if not threaded:
+        yield from decode_frames(video_path, target_fps, downscale)
+        return
+
+    with ThreadedDecoder(video_path, target_fps, downscale) as decoder:
+        yield from decoder
+
+class BackendRunner:
+    """One backend's pass over a video, fed one frame at a time.
+
+    Backends in BATCH_ENTRIES collect `batch_size` frames per call, the
+    others run every frame straight away. `release`, if given with a frame,
+    is called once the backend no longer needs it: for a batched backend
+    only after the whole batch has run.
+    """
+
+    def __init__(self, name, model, batch_size=1):
+        self.name = name
+        self.model = model
+        self.batch_size = batch_size if name in BATCH_ENTRIES else 1
+        self.buffer = KeypointBuffer(N_JOINTS)
+        self.inference = [0.0, 0]
+        self._entry = BACKENDS[name][1]
+        self._pending = []
+
+    def feed(self, frame_index, frame, release=None):
+        if self.batch_size > 1:
+            self._pending.append((frame_index, frame, release))
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+            return
+
+        start = time.perf_counter()
+        found = self._entry(self.model, frame, self.buffer.next_slot())
+        record_inference(self.name, time.perf_counter() - start, 1, self.inference)
+        if found:
+            self.buffer.commit(frame_index)
+        if release is not None:
+            release()
+
+    def flush(self):
+        if not self._pending:
+            return
+        frame_indices, frames, releases = zip(*self._pending)
+        out = np.zeros((len(frames), N_JOINTS, 3), dtype=np.float32)
+        start = time.perf_counter()
+        detected = BATCH_ENTRIES[self.name](self.model, list(frames), out)
+        record_inference(self.name, time.perf_counter() - start, len(frames), self.inference)
+        self.buffer.extend(np.asarray(frame_indices)[detected], out[detected])
+        for release in releases:
+            if release is not None:
+                release()
+        self._pending.clear()
+
+    def finish(self):
+        """Run the last partial batch and return the backend's KeypointBuffer."""
+        self.flush()
+        record_throughput(self.name, *self.inference)
+        return self.buffer
+
+def extract_from_frames(name, frames, batch_size=1):
+    """Run one backend over (frame_index, frame, release) items; returns its KeypointBuffer."""
+    with registry.acquire(name) as model:
+        runner = BackendRunner(name, model, batch_size)
+        for frame_index, frame, release in frames:
+            runner.feed(frame_index, frame, release)
+        return runner.finish()
+
+def iter_extraction(video_path, methods, batch_sizes=None, target_fps=TARGET_FPS, downscale=DOWNSCALE,
+                    frames=None):
+    """Decode the video once and hand every frame to each requested backend.
+
+    `batch_sizes` maps a backend from BATCH_ENTRIES to the number of frames it
+    receives per call; the others see one frame at a time. `target_fps` and
+    `downscale` select the sampling mode described above TARGET_FPS. `frames`
+    replaces the decoder with any iterable of sample_frames() items, e.g.
+    the frames of an upload still in progress.
+
+    Yields the same state dict after every decoded frame and once more at the
+    end: "buffers" holds each backend's KeypointBuffer so far, alongside the
+    source "width"/"height", the inference "scale" and the "frame_index"
+    reached. Batched backends lag behind by up to one batch until the end.
+    """
+    if batch_sizes is None:
+        batch_sizes = {"yolo": YOLO_BATCH_SIZE}
+
+    with ExitStack() as stack:
+        runners = [BackendRunner(name, stack.enter_context(registry.acquire(name)), batch_sizes.get(name, 1))
+                   for name in methods]
+
+        state = {
+            "buffers": {runner.name: runner.buffer for runner in runners},
+            "width": 0,
+            "height": 0,
+            "scale": downscale or 1.0,
+            "frame_index": 0,
+            "done": False
         }
 
-        for i in selected_keypoints:
-            point = keypoints[i]
-            score = scores[i]
-            norm_x = normalize_data(point[0], MIN_X, MAX_X)
-            norm_y = normalize_data(point[1], MIN_Y, MAX_Y)
-            data_entry[f"keypoint_{i}_x"] = norm_x
-            data_entry[f"keypoint_{i}_y"] = norm_y
-            data_entry[f"keypoint_{i}_confidence"] = score
-
-            if i == 5:
-                time_windows_data[current_window_index]["left_shoulder_confidences"].append(score)
-            elif i == 6:
-                time_windows_data[current_window_index]["right_shoulder_confidences"].append(score)
-            elif i == 11:
-                time_windows_data[current_window_index]["left_hip_confidences"].append(score)
-            elif i == 12:
-                time_windows_data[current_window_index]["right_hip_confidences"].append(score)
-
-        dataset.append(data_entry)
-        prev_keypoints = keypoints.copy()
-        prev_time = current_time
-        frame_index += 1
-
-    cap.release()
-    df = pd.DataFrame(dataset)
-    output_csv = "movenet_motion_dataset_with_window_scores.csv"
-    df.to_csv(output_csv, index=False)
-    return output_csv
+        if frames is None:
+            frames = sample_frames(video_path, target_fps, downscale)
+        for frame_index, frame, (width, height), _ in frames:
+            state["width"], state["height"] = width, height
+            for runner in runners:
+                runner.feed(frame_index, frame)
 
-# ---------- YOLO ----------
-def process_yolo(video_path):
-    
-    model = YOLO('models/yolo11n-pose.pt')
-    selected_keypoints = {
-        "left_shoulder": 5, "right_shoulder": 6, "left_elbow": 7, "right_elbow": 8,
-        "left_hip": 11, "right_hip": 12, "left_knee": 13, "right_knee": 14
+            state["frame_index"] = frame_index + 1
+            yield state
+
+        for runner in runners:
+            runner.finish()
+
+        state["done"] = True
+        yield state
+
+def extract_keypoint_frames(video_path, methods, batch_sizes=None, target_fps=TARGET_FPS, downscale=DOWNSCALE,
+                            parallel=PARALLEL_EXTRACTION):
+    """Run iter_extraction to the end and return each backend's keypoint DataFrame."""
+    if parallel and len(methods) > 1:
+        from parallel_extraction import extract_parallel
+        return extract_parallel(video_path, methods, batch_sizes, target_fps, downscale)
+
+    for state in iter_extraction(video_path, methods, batch_sizes, target_fps, downscale):
+        pass
+
+    return {
+        name: keypoint_table(name, state["buffers"][name], state["width"], state["height"], state["scale"])
+        for name in methods
     }
-    dataset = []
-    video_id = 1
-    cap = cv2.VideoCapture(video_path)
-    frame_index = 0
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        results = model(frame)
-        if not results or len(results[0].keypoints) == 0:
-            frame_index += 1
-            continue
 
-        keypoints = results[0].keypoints.data[0].cpu().numpy()
-        height, width, _ = frame.shape
-        keypoints[:, 0] *= width
-        keypoints[:, 1] *= height
+def extract_keypoints(video_path, methods, batch_sizes=None, output_dir=".", **options):
+    """Like extract_keypoint_frames, but writes each table to a CSV file.
 
-        data_entry = {
-            "video_id": video_id,
-            "frame": frame_index,
-            "window_index": frame_index // WINDOW_SIZE
-        }
+    Returns a dict mapping backend name to the CSV path inside `output_dir`.
+    """
+    frames = extract_keypoint_frames(video_path, methods, batch_sizes, **options)
 
-        for name, idx in selected_keypoints.items():
-            if idx >= len(keypoints):
-                continue
-            x, y, conf = keypoints[idx]
-            data_entry[f"{name}_x"] = x / width
-            data_entry[f"{name}_y"] = y / height
-            data_entry[f"{name}_conf"] = float(conf)
+    output_paths = {}
+    for name, df in frames.items():
+        output_csv = os.path.join(output_dir, OUTPUT_CSV[name])
+        df.to_csv(output_csv, index=False, encoding=OUTPUT_ENCODING[name])
+        output_paths[name] = output_csv
+    return output_paths
 
-        dataset.append(data_entry)
-        frame_index += 1
+def process_movenet(video_path):
+    return extract_keypoints(video_path, ["movenet"])["movenet"]
 
-    cap.release()
-    df = pd.DataFrame(dataset)
-    output_csv = "yolo_motion_dataset_with_window_scores.csv"
-    df.to_csv(output_csv, index=False, encoding="utf-8-sig")
-    return output_csv
+def process_yolo(video_path):
+    return extract_keypoints(video_path, ["yolo"])["yolo"]
 
-# ---------- MediaPipe ----------
 def process_mediapipe(video_path):
-    mp_pose = mp.solutions.pose
-    pose = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
-
-    def normalize_data(value, min_val, max_val):
-        return (value - min_val) / (max_val - min_val)
-
-    def initialize_chunk_data():
-        return {
-            "left_shoulder_confidences": [],
-            "right_shoulder_confidences": [],
-            "left_elbow_confidences": [],
-            "right_elbow_confidences": [],
-            "left_hip_confidences": [],
-            "right_hip_confidences": [],
-            "left_knee_confidences": [],
-            "right_knee_confidences": []
-        }
-
-    dataset = []
-    selected_keypoints = [11, 12, 13, 14, 23, 24, 25, 26]
-    MIN_X = -1
-    MAX_X = 1
-    MIN_Y = -1
-    MAX_Y = 1
-    FRAMES_PER_CHUNK = 60
-
-    video_id = 1
-    cap = cv2.VideoCapture(video_path)
-    prev_keypoints = None
-    prev_time = None
-    frame_index = 0
-    chunk_index = 0
-    current_chunk_data = initialize_chunk_data()
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        if frame_index > 0 and frame_index % FRAMES_PER_CHUNK == 0:
-            chunk_start = frame_index - FRAMES_PER_CHUNK
-            chunk_end = frame_index - 1
-            current_chunk_data = initialize_chunk_data()
-            chunk_index += 1
-
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = pose.process(frame_rgb)
-
-        if results.pose_landmarks:
-            height, width, _ = frame.shape
-            keypoints = results.pose_landmarks.landmark
-
-            current_keypoints = []
-            current_scores = []
-            for idx in range(len(keypoints)):
-                kp = keypoints[idx]
-                current_keypoints.append([kp.x * width, kp.y * height])
-                current_scores.append(kp.visibility)
-
-            current_keypoints = np.array(current_keypoints)
-            current_scores = np.array(current_scores)
-            current_time = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
-
-            data_entry = {
-                "video_id": video_id,
-                "frame": frame_index,
-                "chunk_index": chunk_index
+    return extract_keypoints(video_path, ["mediapipe"])["mediapipe"]
+
+def process_all(video_path, output_dir="."):
+    return extract_keypoints(video_path, list(BACKENDS), output_dir=output_dir)
+
+# ---------- Job queue ----------
+# Created on first use so that worker processes, which re-import this module,
+# do not start pools of their own.
+job_queue = None
+
+def get_job_queue():
+    global job_queue
+    if job_queue is None:
+        job_queue = JobQueue(workers=JOB_WORKERS)
+    return job_queue
+
+# ---------- Resumable uploads ----------
+def process_upload(session):
+    """Extraction and ensemble for a resumable upload, on the session's thread.
+
+    A progressive upload starts extracting from its leading chunks; the
+    others wait until the upload has been completed and verified. An upload
+    that expires meanwhile stops its extraction and releases the models.
+    """
+    from pipeline import run_video_pipeline
+
+    try:
+        extracted = None
+        if session.progressive:
+            methods = list(BACKENDS)
+            # sampled like any other extraction, as the result cache keys it on these settings
+            frames = session.frames(TARGET_FPS, DOWNSCALE)
+            for state in iter_extraction(None, methods, downscale=DOWNSCALE, frames=frames):
+                pass
+            extracted = {
+                name: keypoint_table(name, state["buffers"][name], state["width"], state["height"], state["scale"])
+                for name in methods
             }
-
-            for i in selected_keypoints:
-                point = current_keypoints[i]
-                score = current_scores[i]
-                norm_x = normalize_data(point[0], MIN_X, MAX_X)
-                norm_y = normalize_data(point[1], MIN_Y, MAX_Y)
-                data_entry[f"keypoint_{i}_x"] = norm_x
-                data_entry[f"keypoint_{i}_y"] = norm_y
-                data_entry[f"keypoint_{i}_confidence"] = score
-
-                if i == 11:
-                    current_chunk_data["left_shoulder_confidences"].append(score)
-                elif i == 12:
-                    current_chunk_data["right_shoulder_confidences"].append(score)
-                elif i == 23:
-                    current_chunk_data["left_hip_confidences"].append(score)
-                elif i == 24:
-                    current_chunk_data["right_hip_confidences"].append(score)
-
-            dataset.append(data_entry)
-            prev_keypoints = current_keypoints.copy()
-            prev_time = current_time
-
-        frame_index += 1
-
-    if frame_index % FRAMES_PER_CHUNK != 0 and any(len(val) > 0 for val in current_chunk_data.values()):
-        chunk_start = chunk_index * FRAMES_PER_CHUNK
-        chunk_end = frame_index - 1
-
-    cap.release()
-    df = pd.DataFrame(dataset)
-    output_csv = "mediapipe_motion_dataset_with_window_scores.csv"
-    df.to_csv(output_csv, index=False)
-    return output_csv
+        if session.state != "processing":
+            return
+
+        if os.path.exists(session.data_path):
+            workspace, video_path = create_workspace(session.data_path, content_hash=session.content_hash,
+                                                     extension=session.meta["extension"])
+        else:
+            # moved into its workspace before a restart
+            workspace = workspace_dir(session.content_hash)
+            video_path = os.path.join(workspace, "video" + session.meta["extension"])
+        df_output, timings = run_video_pipeline(video_path, workspace, extracted=extracted,
+                                                content_hash=session.content_hash)
+        session.set_state("done", result={
+            "workspace": os.path.basename(workspace),
+            "predictions": df_output.to_dict(orient='records'),
+            "timings": timings
+        })
+    except Exception as e:
+        session.set_state("failed", error=repr(e))
+
+# Created on first use, like the job queue, so worker processes that import
+# this module do not start an expiry thread of their own.
+upload_store = None
+_upload_store_lock = threading.Lock()
+
+def get_upload_store():
+    global upload_store
+    with _upload_store_lock:
+        if upload_store is None:
+            upload_store = UploadStore(processor=process_upload)
+        return upload_store
+
+# The Flutter client uploads through these routes; server.py mounts the
+# same blueprint so they are served on either entry point.
+uploads_blueprint = Blueprint('uploads', __name__)
+
+@uploads_blueprint.route('/uploads', methods=['POST'])
+def create_upload():
+    body = request.get_json(silent=True) or {}
+    try:
+        session = get_upload_store().create(body.get('filename', 'video.mp4'), body.get('size'))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(dict(session.status(), upload_url=f'/uploads/{session.upload_id}')), 201
+
+@uploads_blueprint.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    session = get_upload_store().get(upload_id)
+    if session is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    return jsonify(session.status()), 200
+
+@uploads_blueprint.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    session = get_upload_store().get(upload_id)
+    if session is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        offset = request.headers.get('Upload-Offset', type=int)
+    try:
+        new_offset = session.write_chunk(offset, request.stream, request.headers.get('X-Chunk-Sha256'))
+    except UploadError as e:
+        return jsonify({'error': str(e), **e.details}), e.status
+
+    # fast-start MP4/MOV and WebM/MKV can be decoded while the rest arrives
+    if session.progressive:
+        session.start_worker(process_upload)
+    return jsonify({'offset': new_offset}), 200
+
+@uploads_blueprint.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    session = get_upload_store().get(upload_id)
+    if session is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+
+    sha256 = (request.get_json(silent=True) or {}).get('sha256')
+    try:
+        session.finish(sha256)
+    except UploadError as e:
+        return jsonify({'error': str(e), **e.details}), e.status
+
+    session.start_worker(process_upload)
+    return jsonify(session.status()), 202
+
+app.register_blueprint(uploads_blueprint)
 
 # ---------- API Routes ----------
+@app.route('/models', methods=['GET'])
+def model_status():
+    return jsonify(registry.report()), 200
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return metrics.metrics_response()
+
+@app.route('/metrics/extraction', methods=['GET'])
+def extraction_metrics():
+    import parallel_extraction
+    return jsonify({"frame_ring": parallel_extraction.last_ring_metrics}), 200
+
 @app.route('/upload/<method>', methods=['POST'])
 def upload_video(method):
     if 'file' not in request.files:
@@ -296,23 +565,119 @@ def upload_video(method):
     if video.filename == '':
         return jsonify({'error': 'No selected file'}), 400
 
+    if method != "all" and method not in BACKENDS:
+        return jsonify({'error': f'Invalid method: {method}'}), 400
+
+    yolo_batch = request.args.get('yolo_batch', YOLO_BATCH_SIZE, type=int)
+    if yolo_batch is None or not 1 <= yolo_batch <= MAX_YOLO_BATCH:
+        return jsonify({'error': f'yolo_batch must be an integer between 1 and {MAX_YOLO_BATCH}'}), 400
+    batch_sizes = {"yolo": yolo_batch}
+
     video_path = os.path.join(UPLOAD_FOLDER, video.filename)
     video.save(video_path)
 
-    if method == "movenet":
-        csv_path = process_movenet(video_path)
-    elif method == "yolo":
-        csv_path = process_yolo(video_path)
-    elif method == "mediapipe":
-        csv_path = process_mediapipe(video_path)
-    else:
-        return jsonify({'error': f'Invalid method: {method}'}), 400
+    sampling = {
+        "target_fps": request.args.get('fps', TARGET_FPS, type=float),
+        "downscale": request.args.get('downscale', DOWNSCALE, type=float)
+    }
+
+    if method == "all":
+        parallel = request.args.get('parallel', int(PARALLEL_EXTRACTION), type=int)
+        csv_paths = extract_keypoints(video_path, list(BACKENDS), batch_sizes, parallel=bool(parallel), **sampling)
+        return jsonify({
+            'message': 'Video processed using all models',
+            'csv_files': csv_paths
+        }), 200
+
+    csv_path = extract_keypoints(video_path, [method], batch_sizes, **sampling)[method]
 
     return jsonify({
         'message': f'Video processed using {method}',
         'csv_file': csv_path
     }), 200
 
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    if 'file' not in request.files:
+        return jsonify({'error': 'No video file provided'}), 400
+
+    video = request.files['file']
+    if video.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+
+    # Unique temporary name; the video then moves into its own workspace so
+    # concurrent jobs never share files.
+    upload_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}_{os.path.basename(video.filename)}")
+    video.save(upload_path)
+    workspace, video_path = create_workspace(upload_path)
+
+    job_id = get_job_queue().submit(video_path, workspace)
+    return jsonify({
+        'job_id': job_id,
+        'workspace': os.path.basename(workspace),
+        'status_url': f'/jobs/{job_id}',
+        'events_url': f'/jobs/{job_id}/events'
+    }), 202
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify(get_job_queue().list()), 200
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    status = get_job_queue().status(job_id)
+    if status is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    return jsonify(status), 200
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    if get_job_queue().status(job_id, include_result=False) is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+
+    def stream():
+        for status in get_job_queue().events(job_id):
+            yield f"data: {json.dumps(status)}\n\n"
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream')
+
+@app.route('/stream', methods=['POST'])
+def stream_predictions():
+    """Upload a video and receive ensemble predictions as server-sent events.
+
+    Each event carries one window as soon as TIMESTEPS frames aligned across
+    the three backends have been extracted; a final event has "done": true.
+    """
+    # Loading the GRUs is only needed here, not in the extraction workers
+    from streaming import StreamingEnsemble
+
+    if 'file' not in request.files:
+        return jsonify({'error': 'No video file provided'}), 400
+
+    video = request.files['file']
+    if video.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+
+    upload_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}_{os.path.basename(video.filename)}")
+    video.save(upload_path)
+    workspace, video_path = create_workspace(upload_path)
+
+    def to_features(name, keypoints, state):
+        return feature_rows(name, keypoints, state["width"], state["height"], state["scale"])
+
+    def stream():
+        scorer = StreamingEnsemble(to_features, WINDOW_SIZE, VIDEO_ID)
+        windows = 0
+        # The scorer sequences rows as they arrive and cannot resample them
+        # (see sequences.source_rate), so it always sees every frame.
+        for state in iter_extraction(video_path, list(BACKENDS), target_fps=None):
+            for record in scorer.update(state):
+                windows += 1
+                yield f"data: {json.dumps(record)}\n\n"
+        yield f"data: {json.dumps({'done': True, 'windows': windows, 'workspace': os.path.basename(workspace)})}\n\n"
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream')
+
 if __name__ == '__main__':
+    registry.preload()
     app.run(host='0.0.0.0', port=5000)
-
@@ -0,0 +1,46 @@
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from ensambleModelRun import TIMESTEPS, backends, feature_columns, get_ensemble_engine
+from micro_batcher import MicroBatcher
+
+
+# Throughput of many concurrent small requests (short clips), each calling
+# the engine directly against going through the micro-batcher.
+# Usage: python benchmark_batching.py [clients] [requests per client] [sequences per request]
+
+def run_clients(predict_raw, clients, requests, X_tests):
+    def client():
+        for _ in range(requests):
+            predict_raw(X_tests)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for future in [pool.submit(client) for _ in range(clients)]:
+            future.result()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    sequences = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+    engine = get_ensemble_engine()
+    rng = np.random.default_rng(0)
+    X_tests = {name: rng.random((sequences, TIMESTEPS, len(feature_columns)), dtype=np.float32)
+               for name in backends}
+    engine.predict_raw(X_tests)  # warm-up / tracing
+    total = clients * requests * sequences
+
+    direct = run_clients(engine.predict_raw, clients, requests, X_tests)
+    print(f"direct:        {direct:7.2f}s, {total / direct:9.1f} sequences/sec")
+
+    for max_latency_ms in (1.0, 5.0, 10.0):
+        batcher = MicroBatcher(engine, max_latency_ms=max_latency_ms)
+        batched = run_clients(batcher.predict_raw, clients, requests, X_tests)
+        report = batcher.report()
+        print(f"batched {max_latency_ms:4.1f}ms: {batched:7.2f}s, {total / batched:9.1f} sequences/sec "
+              f"({direct / batched:.2f}x), {report['requests_per_batch']} requests/batch, "
+              f"mean queue wait {report['mean_queue_wait_ms']} ms")
@@ -0,0 +1,73 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+from allModelspreprocess import registry, movenet_entry, N_JOINTS
+from video_decoder import ThreadedDecoder, decode_frames
+
+
+# Compare inline cv2 reads with the threaded decoder, once for decoding alone
+# and once with MoveNet running on every frame (where the decoder thread can
+# overlap with inference). Run it on the phone-recorded MP4/MOV clips. The
+# MoveNet keypoints of every setting are compared with software decoding, as
+# a parity check before video_decoder.HW_ACCELERATION is enabled.
+# Usage: python benchmark_decode.py <video> [<video> ...]
+
+SETTINGS = [
+    {"threaded": False, "hw_acceleration": False},
+    {"threaded": False, "hw_acceleration": True},
+    {"threaded": True, "hw_acceleration": False},
+    {"threaded": True, "hw_acceleration": True}
+]
+
+
+def frames_for(video_path, threaded, hw_acceleration, downscale):
+    if threaded:
+        return ThreadedDecoder(video_path, downscale=downscale, hw_acceleration=hw_acceleration)
+    return decode_frames(video_path, downscale=downscale, hw_acceleration=hw_acceleration)
+
+def run(video_path, model, threaded, hw_acceleration, downscale=None):
+    out = np.zeros((N_JOINTS, 3), dtype=np.float32)
+    frames = 0
+    timestamps = []
+    keypoints = []
+    start = time.perf_counter()
+    for _, frame, _, timestamp_ms in frames_for(video_path, threaded, hw_acceleration, downscale):
+        if model is not None:
+            movenet_entry(model, frame, out)
+            keypoints.append(out.copy())
+        timestamps.append(timestamp_ms)
+        frames += 1
+    elapsed = time.perf_counter() - start
+    return frames, elapsed, timestamps, keypoints
+
+def keypoint_diff(keypoints, baseline):
+    """Largest (x, y, confidence) difference from the software-decoded keypoints."""
+    if not keypoints or len(keypoints) != len(baseline):
+        return None
+    return float(np.abs(np.stack(keypoints) - np.stack(baseline)).max())
+
+
+if __name__ == '__main__':
+    rows = []
+    with registry.acquire("movenet") as interpreter:
+        for video_path in sys.argv[1:]:
+            baseline_timestamps = None
+            baseline_keypoints = None
+            for setting in SETTINGS:
+                for model, mode in ((None, "decode"), (interpreter, "decode+movenet")):
+                    frames, elapsed, timestamps, keypoints = run(video_path, model, **setting)
+                    if baseline_timestamps is None:
+                        baseline_timestamps = timestamps
+                    if keypoints and baseline_keypoints is None:
+                        baseline_keypoints = keypoints
+                    rows.append({
+                        "video": video_path, "mode": mode, **setting,
+                        "frames": frames,
+                        "fps": round(frames / elapsed, 1) if elapsed else None,
+                        "timestamps_match": timestamps == baseline_timestamps,
+                        "keypoint_max_diff": keypoint_diff(keypoints, baseline_keypoints)
+                    })
+
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False))
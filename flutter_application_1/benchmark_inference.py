@@ -0,0 +1,40 @@
+import sys
+import time
+import numpy as np
+from ensambleModelRun import (
+    TIMESTEPS, feature_columns, get_ensemble_engine, predict_all_models_sequential
+)
+
+
+# Latency and throughput of the fused ensemble against the three sequential
+# model.predict calls, for several batch sizes of random sequences.
+# Usage: python benchmark_inference.py [repeats] [batch sizes...]
+
+def benchmark(fn, X_tests, repeats):
+    fn(X_tests)  # warm-up / tracing
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(X_tests)
+    return (time.perf_counter() - start) / repeats
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    batch_sizes = [int(b) for b in sys.argv[2:]] or [1, 8, 32, 128]
+
+    # the engine itself, not the micro-batcher in front of it, so the fused
+    # timing does not include the batching wait
+    engine = get_ensemble_engine()
+    rng = np.random.default_rng(0)
+    for batch_size in batch_sizes:
+        X_tests = {
+            name: rng.random((batch_size, TIMESTEPS, len(feature_columns)), dtype=np.float32)
+            for name in ['yolo', 'movenet', 'mediapipe']
+        }
+        sequential = benchmark(predict_all_models_sequential, X_tests, repeats)
+        fused = benchmark(engine.predict_raw, X_tests, repeats)
+        print(f"batch {batch_size:4d}: sequential {1000 * sequential:8.2f} ms, "
+              f"fused {1000 * fused:8.2f} ms ({sequential / fused:.2f}x), "
+              f"{batch_size / fused:9.1f} sequences/sec")
+
+    print(engine.report())
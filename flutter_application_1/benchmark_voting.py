@@ -0,0 +1,64 @@
+import sys
+import time
+import numpy as np
+from voting import vote
+
+
+# The vectorised voting in voting.py against the previous implementation
+# (Python list stacking + scipy.stats.mode), on random model outputs for
+# several numbers of models and sequences. No model is loaded.
+# Usage: python benchmark_voting.py [repeats] [sequence counts...]
+
+N_CLASSES = 3
+
+
+def scipy_majority(preds, weights):
+    from scipy.stats import mode
+
+    model_names = list(preds.keys())
+    movement = np.average(np.array([preds[m]['movement'] for m in model_names]), axis=0, weights=weights)
+    knee_preds = np.array([preds[m]['knee'] for m in model_names])
+    elbow_preds = np.array([preds[m]['elbow'] for m in model_names])
+    return movement, mode(knee_preds, axis=0).mode, mode(elbow_preds, axis=0).mode
+
+def random_outputs(rng, n_models, n_sequences):
+    preds = {}
+    for i in range(n_models):
+        knee_probs = rng.dirichlet(np.ones(N_CLASSES), n_sequences).astype(np.float32)
+        elbow_probs = rng.dirichlet(np.ones(N_CLASSES), n_sequences).astype(np.float32)
+        preds[f"model_{i}"] = {
+            'movement': rng.random(n_sequences, dtype=np.float32),
+            'knee_probs': knee_probs,
+            'elbow_probs': elbow_probs,
+            'knee': knee_probs.argmax(axis=1),
+            'elbow': elbow_probs.argmax(axis=1)
+        }
+    return preds
+
+def benchmark(fn, repeats):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    sequence_counts = [int(n) for n in sys.argv[2:]] or [1, 100, 10_000, 1_000_000]
+
+    rng = np.random.default_rng(0)
+    for n_models in (3, 8):
+        weights = rng.random(n_models)
+        for n_sequences in sequence_counts:
+            preds = random_outputs(rng, n_models, n_sequences)
+
+            expected = scipy_majority(preds, weights)
+            got = vote(preds, weights, 'hard')
+            assert all(np.array_equal(np.ravel(a), b) for a, b in zip(expected[1:], got[1:]))
+
+            reference = benchmark(lambda: scipy_majority(preds, weights), repeats)
+            hard = benchmark(lambda: vote(preds, weights, 'hard'), repeats)
+            soft = benchmark(lambda: vote(preds, weights, 'soft'), repeats)
+            print(f"{n_models} models, {n_sequences:8d} sequences: scipy {1000 * reference:9.3f} ms, "
+                  f"hard {1000 * hard:9.3f} ms ({reference / hard:5.1f}x), soft {1000 * soft:9.3f} ms")
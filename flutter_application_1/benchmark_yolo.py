@@ -0,0 +1,64 @@
+import sys
+import time
+import cv2
+import numpy as np
+from allModelspreprocess import registry, yolo_entry, yolo_batch_entries, N_JOINTS
+from keypoint_buffer import KeypointBuffer
+
+
+# Compare the per-frame YOLO loop with batched inference on the same frames.
+# Usage: python benchmark_yolo.py <video> [max_frames] [batch sizes...]
+
+def read_frames(video_path, max_frames):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while cap.isOpened() and len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+def run_per_frame(model, frames):
+    buffer = KeypointBuffer(N_JOINTS)
+    for frame_index, frame in enumerate(frames):
+        if yolo_entry(model, frame, buffer.next_slot()):
+            buffer.commit(frame_index)
+    return buffer
+
+def run_batched(model, frames, batch_size):
+    buffer = KeypointBuffer(N_JOINTS)
+    for start in range(0, len(frames), batch_size):
+        batch = frames[start:start + batch_size]
+        out = np.zeros((len(batch), N_JOINTS, 3), dtype=np.float32)
+        detected = yolo_batch_entries(model, batch, out)
+        buffer.extend(np.arange(start, start + len(batch))[detected], out[detected])
+    return buffer
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    video_path = sys.argv[1]
+    max_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    batch_sizes = [int(b) for b in sys.argv[3:]] or [8, 16, 32]
+
+    frames = read_frames(video_path, max_frames)
+    print(f"Decoded {len(frames)} frames from {video_path}")
+
+    with registry.acquire("yolo") as model:
+        baseline, baseline_time = timed(run_per_frame, model, frames)
+        baseline_fps = len(frames) / baseline_time
+        print(f"per-frame : {baseline_fps:7.2f} frames/sec")
+
+        baseline_ids = baseline.data()[0]
+        for batch_size in batch_sizes:
+            buffer, batch_time = timed(run_batched, model, frames, batch_size)
+            fps = len(frames) / batch_time
+            same_ids = np.array_equal(buffer.data()[0], baseline_ids)
+            print(f"batch {batch_size:3d} : {fps:7.2f} frames/sec "
+                  f"({fps / baseline_fps:.2f}x, frame/window ids match: {same_ids})")
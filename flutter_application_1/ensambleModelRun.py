@@ -1,31 +1,130 @@
-from tensorflow.keras.models import load_model
+import time
+_import_started = time.perf_counter()
+
+import os
+import threading
 import numpy as np
-from scipy.stats import mode
 import pandas as pd
 from flask_cors import CORS
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
+import metrics
+from workspace import workspace_dir
+from keypoint_store import FEATURE_COLUMNS, has_keypoints, load_extraction, load_keypoints
+from model_config import ensemble_model_path
+from result_cache import get_result_cache
+from frame_alignment import align_frames, gather_features
+from voting import vote
+from micro_batcher import MAX_BATCH_SEQUENCES, MAX_LATENCY_MS, MicroBatcher
+from sequences import sequence_metadata, sequence_views, source_rate
 
 app = Flask(__name__)
 CORS(app)
 
-model_yolo = load_model('models/best_yolo_infant_movement_model.keras')
-model_movenet = load_model('models/best_movenet_infant_movement_model.keras')
-model_mediapipe = load_model('models/best_mediapipe_infant_movement_model.keras')
-
-print("Models Loaded Successfully")
+# "keras" serves the .keras models through TensorFlow; "tflite" serves the
+# files written by export_tflite.py through the TFLite interpreter, which
+# starts faster and needs far less memory.
+ENSEMBLE_BACKEND = os.environ.get("ENSEMBLE_BACKEND", "keras")
+TFLITE_QUANTIZATION = os.environ.get("TFLITE_QUANTIZATION") or None
+
+# Concurrent requests share GRU forward passes through micro_batcher.py: a
+# batch is held open for up to BATCH_MAX_LATENCY_MS or BATCH_MAX_SEQUENCES.
+MICRO_BATCHING = os.environ.get("MICRO_BATCHING", "1") == "1"
+BATCH_MAX_SEQUENCES = int(os.environ.get("BATCH_MAX_SEQUENCES", MAX_BATCH_SEQUENCES))
+BATCH_MAX_LATENCY_MS = float(os.environ.get("BATCH_MAX_LATENCY_MS", MAX_LATENCY_MS))
+
+# The models load in a background thread started at import, so the server can
+# bind its port and answer /health straight away; anything that needs the
+# models waits in get_ensemble_engine() until they are ready.
+ensemble_engine = None
+ensemble_batcher = None
+_engine_ready = threading.Event()
+_engine_error = None
+_engine_lock = threading.Lock()
+_loader_thread = None
+startup_timings = {"backend": ENSEMBLE_BACKEND}
+
+
+def _load_ensemble_engine():
+    global ensemble_engine, ensemble_batcher, _engine_error
+    start = time.perf_counter()
+    try:
+        if ENSEMBLE_BACKEND == "tflite":
+            from tflite_engine import TFLiteEnsemble
+
+            engine = TFLiteEnsemble(['yolo', 'movenet', 'mediapipe'], TFLITE_QUANTIZATION)
+        else:
+            from tensorflow.keras.models import load_model
+            from inference_engine import FusedEnsemble
+
+            # The three GRUs as one graph: a single forward pass per batch for all of them
+            engine = FusedEnsemble({
+                'yolo': load_model(ensemble_model_path('yolo')),
+                'movenet': load_model(ensemble_model_path('movenet')),
+                'mediapipe': load_model(ensemble_model_path('mediapipe'))
+            })
+        startup_timings["model_load_seconds"] = round(time.perf_counter() - start, 3)
+
+        # One tiny batch traces the graph / allocates the interpreters now
+        # rather than on the first real request.
+        start = time.perf_counter()
+        engine.predict_raw({name: np.zeros((1, TIMESTEPS, len(FEATURE_COLUMNS)), dtype=np.float32)
+                            for name in ['yolo', 'movenet', 'mediapipe']})
+        startup_timings["warmup_seconds"] = round(time.perf_counter() - start, 3)
+
+        if MICRO_BATCHING:
+            ensemble_batcher = MicroBatcher(engine, BATCH_MAX_SEQUENCES, BATCH_MAX_LATENCY_MS)
+        ensemble_engine = engine
+        print(f"Models Loaded Successfully ({startup_timings['model_load_seconds']}s, "
+              f"warm-up {startup_timings['warmup_seconds']}s)")
+    except Exception as e:
+        _engine_error = e
+        print(f"Loading the ensemble models failed: {e!r}")
+    finally:
+        startup_timings["ready_after_seconds"] = round(time.perf_counter() - _import_started, 3)
+        _engine_ready.set()
+
+def start_loading_models():
+    global _loader_thread
+    with _engine_lock:
+        if _loader_thread is None:
+            _loader_thread = threading.Thread(target=_load_ensemble_engine, name="ensemble-loader", daemon=True)
+            _loader_thread.start()
+
+def get_ensemble_engine(timeout=None):
+    """Return the loaded engine, waiting for the background load if needed."""
+    start_loading_models()
+    if not _engine_ready.wait(timeout):
+        raise TimeoutError("Ensemble models are still loading")
+    if _engine_error is not None:
+        raise RuntimeError("Ensemble models failed to load") from _engine_error
+    return ensemble_engine
 
 def predict_all_models(X_tests):
+        engine = get_ensemble_engine()
+        if ensemble_batcher is not None:
+            engine = ensemble_batcher
         preds = {}
-        for name, model in {
-            'yolo': model_yolo,
-            'movenet': model_movenet,
-            'mediapipe': model_mediapipe
-        }.items():
+        for name, (movement, knee_probs, elbow_probs) in engine.predict_raw(X_tests).items():
+            preds[name] = {
+                'movement': movement.reshape(-1),
+                'knee_probs': knee_probs,
+                'elbow_probs': elbow_probs,
+                'knee': np.argmax(knee_probs, axis=1),
+                'elbow': np.argmax(elbow_probs, axis=1)
+            }
+        return preds
+
+def predict_all_models_sequential(X_tests):
+        # Only available with the Keras backend, for benchmarking the fused graph
+        preds = {}
+        for name, model in get_ensemble_engine().models.items():
             print(f"Running prediction for {name}")
             X_test = X_tests[name]  
             movement, knee_probs, elbow_probs = model.predict(X_test, verbose=0)
             preds[name] = {
-                'movement': movement.squeeze(),
+                'movement': movement.reshape(-1),
+                'knee_probs': knee_probs,
+                'elbow_probs': elbow_probs,
                 'knee': np.argmax(knee_probs, axis=1),
                 'elbow': np.argmax(elbow_probs, axis=1)
          }
@@ -33,57 +132,34 @@ def predict_all_models(X_tests):
 
 # Ensemble function
 def ensemble_predictions(preds, weights=None, vote_type='majority', class_weights=None):
-        model_names = list(preds.keys())
-        n_models = len(model_names)
-
-    # Default: equal weights for regression models
-        if weights is None:
-            weights = np.ones(n_models) / n_models
-
-    # Regression result: weighted average
-        movement_preds = np.array([preds[m]['movement'] for m in model_names])
-        movement_ensemble = np.average(movement_preds, axis=0, weights=weights)
-
-    # Classification: majority or weighted voting
-        knee_preds = np.array([preds[m]['knee'] for m in model_names])
-        elbow_preds = np.array([preds[m]['elbow'] for m in model_names])
+        """(movement, knee, elbow) per sequence; see voting.py.
 
+        vote_type is 'majority' (one vote per model), 'weighted' (per-model
+        class_weights) or 'soft' (averaged class probabilities).
+        """
         if vote_type == 'majority':
-            knee_ensemble = mode(knee_preds, axis=0).mode[0]
-            elbow_ensemble = mode(elbow_preds, axis=0).mode[0]
-
-        elif vote_type == 'weighted':
-        # class_weights must be provided as dict with weights
-            if class_weights is None:
-                raise ValueError("class_weights required for weighted voting")
-
-            w_knee = np.array([class_weights[m]['knee'] for m in model_names])
-            w_elbow = np.array([class_weights[m]['elbow'] for m in model_names])
-
-        # Weighted vote -> weighted sum > 0.5 -> 1
-            knee_weighted = np.average(knee_preds, axis=0, weights=w_knee)
-            elbow_weighted = np.average(elbow_preds, axis=0, weights=w_elbow)
-
-            knee_ensemble = (knee_weighted > 0.5).astype(int)
-            elbow_ensemble = (elbow_weighted > 0.5).astype(int)
-
-        else:
-            raise ValueError("vote_type must be either 'majority' or 'weighted'")
-
-        return movement_ensemble, knee_ensemble, elbow_ensemble
+            vote_type = 'hard'
+        elif vote_type not in ('weighted', 'soft'):
+            raise ValueError("vote_type must be 'majority', 'weighted' or 'soft'")
+        return vote(preds, weights, vote_type, class_weights)
 
 
 def run_ensemble_evaluation(X_test, y_true_movement, y_true_knee, y_true_elbow):
         preds = predict_all_models(X_test)
-        movement_pred, knee_pred, elbow_pred = ensemble_predictions(preds, weights=weights_motion, vote_type='majority')
+        movement_pred, knee_pred, elbow_pred = ensemble_predictions(preds, weights=weights_motion, vote_type=VOTE_TYPE)
 
 TIMESTEPS = 30
 STEP = 30  # קפיצה של חלון שלם, בלי חפיפה
+# Frames between the starts of consecutive sequences (ENSEMBLE_HOP, e.g. 5).
+# Below TIMESTEPS the sequences overlap and every one of them is scored
+# (denser predictions); at STEP there is one prediction per window, as the
+# models were trained.
+HOP = int(os.environ.get("ENSEMBLE_HOP", STEP))
+if HOP < 1:
+    raise ValueError(f"ENSEMBLE_HOP must be a positive number of frames, got {HOP}")
 def create_sequences_sampled(X, timesteps, step=STEP):
-        sequences = []
-        for i in range(0, len(X) - timesteps + 1, step):
-            sequences.append(X[i:i+timesteps])
-        return np.array(sequences)
+        # strided view, no copy; see sequences.py
+        return sequence_views(X, timesteps, step)
 
 
 rmse_values = {
@@ -95,86 +171,215 @@ inv = {k: 1/v for k, v in rmse_values.items()}
 total = sum(inv.values())
 weights_motion = [inv['yolo']/total, inv['movenet']/total, inv['mediapipe']/total]
 
+# How the knee/elbow heads are combined: 'majority' or 'soft' (see voting.py)
+VOTE_TYPE = os.environ.get("ENSEMBLE_VOTE_TYPE", "majority")
+
+
+feature_columns = FEATURE_COLUMNS
+keys = ['video_id', 'frame', 'window_id']
+backends = ['yolo', 'movenet', 'mediapipe']
+
+
+def ensemble_signature():
+    """Model files and settings behind the predictions, for the result cache."""
+    if ENSEMBLE_BACKEND == "tflite":
+        from tflite_engine import tflite_path
+        files = [tflite_path(name, TFLITE_QUANTIZATION) for name in backends]
+    else:
+        files = [ensemble_model_path(name) for name in backends]
+    return {
+        "files": files,
+        "config": {
+            "backend": ENSEMBLE_BACKEND,
+            "quantization": TFLITE_QUANTIZATION,
+            "timesteps": TIMESTEPS,
+            "step": STEP,
+            "hop": HOP,
+            "weights_motion": weights_motion,
+            "vote_type": VOTE_TYPE
+        }
+    }
 
-@app.route('/predict')
-def predict():
 
-    df_yolo = pd.read_csv('test_yolo_dataset.csv')
-    df_movenet = pd.read_csv('test_movenet_dataset.csv')
-    df_mediapipe = pd.read_csv('test_mediapipe_dataset.csv')
+def predict_from_files(workdir="."):
+    dfs = {
+        name: pd.read_csv(os.path.join(workdir, f'test_{name}_dataset.csv'))
+        for name in backends
+    }
+    return predict_from_frames(dfs, workdir)
 
 
-    keys = ['video_id', 'frame', 'window_id']
+def predict_from_frames(dfs, workdir=".", stride=1.0):
+    """Run the ensemble on standardised backend tables held in memory.
 
+    `dfs` maps 'yolo', 'movenet' and 'mediapipe' to the output of
+    additionalPreprocess.standardize_backends, extracted every `stride`
+    source frames. The predictions are also saved to
+    ensemble_predictions_with_ids.csv inside `workdir`.
+    """
+    for name in backends:
+        print(f"df_{name} rows: {len(dfs[name])}")
 
-    df_common = df_yolo[keys].merge(df_movenet[keys], on=keys).merge(df_mediapipe[keys], on=keys)
+    rows, df_common = align_frames({name: {column: dfs[name][column].to_numpy() for column in keys}
+                                    for name in backends})
+    print(f"df_common rows after alignment: {len(df_common)}")
 
-    print(f"df_yolo rows: {len(df_yolo)}")
-    print(f"df_movenet rows: {len(df_movenet)}")
-    print(f"df_mediapipe rows: {len(df_mediapipe)}")
-    print(f"df_common rows after merge: {len(df_common)}")
+    X_tests = {
+        name: gather_features(dfs[name][feature_columns].to_numpy(dtype=np.float32), rows[name])
+        for name in backends
+    }
+    X_tests, df_common = source_rate(X_tests, df_common, stride)
+    return predict_aligned(X_tests, df_common, workdir)
 
 
-    df_yolo_filtered = pd.merge(df_yolo, df_common, on=keys)
-    df_movenet_filtered = pd.merge(df_movenet, df_common, on=keys)
-    df_mediapipe_filtered = pd.merge(df_mediapipe, df_common, on=keys)
+def align_store(workdir):
+    """Aligned (X_tests, df_common) from the binary keypoint store of a workspace.
 
+    Only the key columns are read to find the common frames; the feature rows
+    are then gathered straight from the memory-mapped matrices. Sampled
+    extractions come back at one row per source frame (see source_rate),
+    using the stride recorded in the store.
+    """
+    stored = {name: load_keypoints(workdir, name) for name in backends}
+    rows, df_common = align_frames({name: store_keys for name, (store_keys, _) in stored.items()})
+    print(f"df_common rows after alignment: {len(df_common)}")
 
-    feature_columns = [
-     'left_shoulder_x', 'left_shoulder_y', 'left_shoulder_confidence',
-     'right_shoulder_x', 'right_shoulder_y', 'right_shoulder_confidence',
-     'left_elbow_x', 'left_elbow_y', 'left_elbow_confidence',
-     'right_elbow_x', 'right_elbow_y', 'right_elbow_confidence',
-     'left_hip_x', 'left_hip_y', 'left_hip_confidence',
-     'right_hip_x', 'right_hip_y', 'right_hip_confidence',
-     'left_knee_x', 'left_knee_y', 'left_knee_confidence',
-     'right_knee_x', 'right_knee_y', 'right_knee_confidence'
-    ]
+    X_tests = {name: gather_features(stored[name][1], rows[name]) for name in backends}
+    stride = load_extraction(workdir, backends[0]).get("stride", 1.0)
+    return source_rate(X_tests, df_common, stride)
 
 
-    X_test_yolo = df_yolo_filtered[feature_columns].values
-    X_test_movenet = df_movenet_filtered[feature_columns].values
-    X_test_mediapipe = df_mediapipe_filtered[feature_columns].values
+def predict_from_store(workdir):
+    """Run the ensemble on the binary keypoint store of a workspace."""
+    X_tests, df_common = align_store(workdir)
+    return predict_aligned(X_tests, df_common, workdir)
 
 
- 
+def aligned_sequences(X_tests):
+    """GRU input sequences for feature rows aligned across the backends."""
+    return {name: sequence_views(X_tests[name], TIMESTEPS, HOP) for name in backends}
 
-    X_test_yolo_seq = create_sequences_sampled(X_test_yolo, TIMESTEPS, STEP)
-    X_test_movenet_seq = create_sequences_sampled(X_test_movenet, TIMESTEPS, STEP)
-    X_test_mediapipe_seq = create_sequences_sampled(X_test_mediapipe, TIMESTEPS, STEP)
 
-    X_tests = {
-        'yolo': X_test_yolo_seq,
-        'movenet': X_test_movenet_seq,
-        'mediapipe': X_test_mediapipe_seq
-    }
+def predictions_frame(predictions, df_common):
+    """Vote the per-model predictions and attach them to the sequence metadata."""
+    voted = ensemble_predictions(predictions, weights=weights_motion, vote_type=VOTE_TYPE)
+    return voted_frame(voted, df_common)
+
 
+def voted_frame(voted, df_common):
+    """Attach (movement, knee, elbow) ensemble outputs to the sequence metadata."""
+    movement_pred, knee_pred, elbow_pred = voted
+    df_output = sequence_metadata(df_common, TIMESTEPS, HOP)
+    df_output['movement_prediction'] = movement_pred
+    df_output['knee_prediction'] = knee_pred
+    df_output['elbow_prediction'] = elbow_pred
 
-    predictions = predict_all_models(X_tests)
-    movement_pred, knee_pred, elbow_pred = ensemble_predictions(predictions, weights=weights_motion, vote_type='majority')
+    if HOP >= TIMESTEPS:
+        # only the first sequence ending in a window counts
+        df_output = df_output.drop_duplicates(subset=['video_id', 'window_id'], keep='first')
+    return df_output.reset_index(drop=True)
 
 
-    df_common_seq = df_common.iloc[(TIMESTEPS - 1)::STEP].reset_index(drop=True)
-    duplicates = df_common_seq[df_common_seq.duplicated(subset=['video_id', 'window_id'], keep=False)]
-    df_common_seq = df_common_seq.drop_duplicates(subset=['video_id', 'window_id'], keep='first').reset_index(drop=True)
+def predict_aligned(X_tests, df_common, workdir="."):
+    """Score feature rows that are already aligned across the three backends."""
+    predictions = predict_all_models(aligned_sequences(X_tests))
+    df_output = predictions_frame(predictions, df_common)
 
+    df_output.to_csv(os.path.join(workdir, 'ensemble_predictions_with_ids.csv'), index=False)
 
-    df_preds = pd.DataFrame({
-     'movement_prediction': movement_pred,
-     'knee_prediction': knee_pred,
-     'elbow_prediction': elbow_pred
-    })
+    print("predictions were saved to ensemble_predictions.csv")
+    return df_output
 
-    df_output = pd.concat([df_common_seq, df_preds], axis=1)
 
-    df_output = df_output.dropna(subset=['video_id', 'window_id', 'frame'])
-    df_output = df_output.drop(columns=['frame'])
+@app.route('/health')
+def health():
+    # Answers as soon as the process is up, whether or not the models are loaded
+    return jsonify({'status': 'ok', 'models_ready': ensemble_engine is not None})
 
-    df_output.to_csv('ensemble_predictions_with_ids.csv', index=False)
 
-    print("predictions were saved to ensemble_predictions.csv")
+@app.route('/ready')
+def ready():
+    status = dict(startup_timings, ready=ensemble_engine is not None)
+    if _engine_error is not None:
+        status['error'] = repr(_engine_error)
+        return jsonify(status), 500
+    return jsonify(status), 200 if ensemble_engine is not None else 503
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return metrics.metrics_response()
+
+
+@app.route('/metrics/inference')
+def inference_metrics():
+    return jsonify(get_ensemble_engine().report())
+
+
+@app.route('/metrics/batching')
+def batching_metrics():
+    get_ensemble_engine()
+    if ensemble_batcher is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(ensemble_batcher.report(), enabled=True))
+
+
+@app.route('/metrics/cache')
+def cache_metrics():
+    return jsonify(get_result_cache().report())
+
+
+@app.route('/predict')
+def predict():
+    df_output = predict_from_files()
+    return jsonify(df_output.to_dict(orient='records'))
+
+
+@app.route('/predict/<video_hash>')
+def predict_workspace(video_hash):
+    try:
+        workdir = workspace_dir(video_hash)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    requested = {
+        "target_fps": request.args.get('fps', type=float),
+        "downscale": request.args.get('downscale', type=float)
+    }
+    # The cache key follows the settings the workspace's keypoints were
+    # extracted with, recorded in the store; the query can only ask for them.
+    stored = os.path.isdir(workdir) and all(has_keypoints(workdir, name) for name in backends)
+    if stored:
+        extraction = load_extraction(workdir, backends[0])
+        settings = {key: extraction.get(key) for key in requested}
+        mismatched = {key: value for key, value in requested.items()
+                      if value is not None and value != settings[key]}
+        if mismatched:
+            return jsonify({'error': f'Workspace {video_hash} was extracted with {settings}, not {mismatched}'}), 409
+    else:
+        settings = requested
+
+    cache = get_result_cache()
+    records = cache.get_predictions(video_hash, ensemble_signature(), settings)
+    if records is not None:
+        return jsonify(records)
+
+    if not os.path.isdir(workdir):
+        return jsonify({'error': f'Unknown workspace: {video_hash}'}), 404
+
+    if stored:
+        df_output = predict_from_store(workdir)
+        cache.put_predictions(video_hash, ensemble_signature(), df_output, settings)
+    else:
+        # the CSV tables do not record their settings, so they are not cached
+        df_output = predict_from_files(workdir)
     return jsonify(df_output.to_dict(orient='records'))
 
 
+startup_timings["import_seconds"] = round(time.perf_counter() - _import_started, 3)
+start_loading_models()
+
+
 if __name__ == '__main__':
-    app.run(debug=True, port=8080)
\ No newline at end of file
+    # The debug reloader would import this module, and load the models, twice
+    app.run(debug=True, port=8080, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,152 @@
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from tensorflow.keras.models import load_model
+from keypoint_store import FEATURE_COLUMNS
+from model_config import ensemble_model_path
+from tflite_engine import TFLiteModel, tflite_path
+from startup_timing import measure_startup
+
+
+# Converts the three ensemble GRUs to TFLite (optionally float16 or int8
+# dynamic-range quantised), checks the converted models against the Keras
+# originals on the labelled test sets from the training notebooks, and
+# compares service startup time and peak memory for both serving backends.
+# Usage: python export_tflite.py [float16|int8|none ...]
+
+BACKENDS = ['yolo', 'movenet', 'mediapipe']
+TIMESTEPS = 30
+STEP = 30
+TEST_DATA = "../ProjectProgress/14525/test_{name}_dataset.csv"
+
+# The notebooks encode dominant_knee/dominant_elbow with a LabelEncoder fitted
+# on the training set, i.e. the sorted class names become ids 0, 1, ...
+SIDE_CLASSES = np.array(["left", "right"])
+
+
+def convert(model, quantization):
+    """Returns (flatbuffer, needs_flex_ops)."""
+    def make_converter():
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        if quantization in ("float16", "int8"):
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantization == "float16":
+            converter.target_spec.supported_types = [tf.float16]
+        return converter
+
+    try:
+        return make_converter().convert(), False
+    except Exception as e:
+        # Some GRU configurations only convert with TensorFlow ops enabled;
+        # those models then need the full TF Lite runtime with Flex delegate.
+        print(f"Builtin-only conversion failed ({e}); retrying with Select TF ops")
+        converter = make_converter()
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS]
+        return converter.convert(), True
+
+def match_outputs(model, flatbuffer):
+    """Work out which TFLite output is movement / knee / elbow.
+
+    TFLite does not keep the Keras output order, so a probe batch is run
+    through both and each Keras output is matched to the closest TFLite one.
+    """
+    probe = np.random.default_rng(0).random((4,) + model.input_shape[1:], dtype=np.float32)
+    keras_outputs = [np.asarray(o) for o in model(probe, training=False)]
+
+    interpreter = tf.lite.Interpreter(model_content=flatbuffer)
+    input_index = interpreter.get_input_details()[0]['index']
+    interpreter.resize_tensor_input(input_index, probe.shape)
+    interpreter.allocate_tensors()
+    interpreter.set_tensor(input_index, probe)
+    interpreter.invoke()
+    tflite_outputs = [interpreter.get_tensor(d['index']) for d in interpreter.get_output_details()]
+
+    order = []
+    for keras_output in keras_outputs:
+        candidates = [
+            (np.abs(out - keras_output).max(), i) for i, out in enumerate(tflite_outputs)
+            if out.shape == keras_output.shape and i not in order
+        ]
+        order.append(min(candidates)[1])
+    return order, [list(o.shape[1:]) for o in keras_outputs]
+
+def export(name, quantization):
+    model = load_model(ensemble_model_path(name))
+    flatbuffer, needs_flex = convert(model, quantization)
+    order, shapes = match_outputs(model, flatbuffer)
+
+    path = tflite_path(name, quantization)
+    with open(path, "wb") as f:
+        f.write(flatbuffer)
+    with open(path + ".json", "w") as f:
+        json.dump({"output_order": order, "output_shapes": shapes, "needs_flex_ops": needs_flex,
+                   "quantization": quantization}, f)
+
+    print(f"{name}: wrote {path} ({os.path.getsize(path) / 1e6:.2f} MB, "
+          f"Keras file {os.path.getsize(ensemble_model_path(name)) / 1e6:.2f} MB)")
+    return model, path
+
+def encode_side(values, column):
+    """Class ids for a dominant_* column, as the training LabelEncoder produced them."""
+    values = np.asarray(values)
+    if values.dtype.kind in "OUS":
+        values = values.astype(str)
+        unknown = sorted(set(values) - set(SIDE_CLASSES))
+        if unknown:
+            raise ValueError(f"{column} has labels the models were not trained on: {unknown}")
+        values = np.searchsorted(SIDE_CLASSES, values)
+    if not np.issubdtype(values.dtype, np.integer):
+        raise ValueError(f"{column} must hold integer class ids, got {values.dtype}")
+    return values
+
+def test_sequences(name):
+    df = pd.read_csv(TEST_DATA.format(name=name))
+    X = df[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+    starts = np.arange(0, len(X) - TIMESTEPS + 1, STEP)
+    X_seq = np.stack([X[s:s + TIMESTEPS] for s in starts])
+    labels = df.iloc[starts + TIMESTEPS - 1]
+    return (X_seq, labels['overall_movement_score'].to_numpy(),
+            encode_side(labels['dominant_knee'].to_numpy(), 'dominant_knee'),
+            encode_side(labels['dominant_elbow'].to_numpy(), 'dominant_elbow'))
+
+def scores(outputs, y_movement, y_knee, y_elbow):
+    movement, knee_probs, elbow_probs = outputs
+    return {
+        "movement_rmse": float(np.sqrt(np.mean((movement.squeeze() - y_movement) ** 2))),
+        "knee_accuracy": float(np.mean(np.argmax(knee_probs, axis=1) == y_knee)),
+        "elbow_accuracy": float(np.mean(np.argmax(elbow_probs, axis=1) == y_elbow))
+    }
+
+def parity(name, model, path):
+    X_seq, y_movement, y_knee, y_elbow = test_sequences(name)
+    keras_outputs = model.predict(X_seq, verbose=0)
+    tflite_outputs = TFLiteModel(path).predict(X_seq)
+
+    row = {"model": name}
+    row.update({f"keras_{k}": v for k, v in scores(keras_outputs, y_movement, y_knee, y_elbow).items()})
+    row.update({f"tflite_{k}": v for k, v in scores(tflite_outputs, y_movement, y_knee, y_elbow).items()})
+    row["max_movement_diff"] = float(np.abs(keras_outputs[0] - tflite_outputs[0]).max())
+    row["knee_agreement"] = float(np.mean(np.argmax(keras_outputs[1], 1) == np.argmax(tflite_outputs[1], 1)))
+    row["elbow_agreement"] = float(np.mean(np.argmax(keras_outputs[2], 1) == np.argmax(tflite_outputs[2], 1)))
+    return row
+
+if __name__ == '__main__':
+    quantizations = [None if q == "none" else q for q in sys.argv[1:]] or [None, "float16", "int8"]
+
+    parity_rows = []
+    for quantization in quantizations:
+        for name in BACKENDS:
+            model, path = export(name, quantization)
+            row = parity(name, model, path)
+            row["quantization"] = quantization
+            parity_rows.append(row)
+
+    print("\nParity against the Keras models:")
+    print(pd.DataFrame(parity_rows).to_string(index=False))
+
+    startup_rows = [measure_startup("keras")] + [measure_startup("tflite", q) for q in quantizations]
+    print("\nService startup:")
+    print(pd.DataFrame(startup_rows).to_string(index=False))
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+
+# Aligns the backend tables on (video_id, frame, window_id) without joins.
+# Every (video_id, frame) gets a slot in one dense index that covers the
+# frame range of each video; a backend is then a row-number array over those
+# slots plus a validity mask. The common frames are the AND of the masks, and
+# each backend's aligned feature rows come from one gather with the row
+# numbers of those slots. Everything is linear in the number of frames, and
+# the result is ordered by video_id, then frame.
+
+KEY_COLUMNS = ['video_id', 'frame', 'window_id']
+
+
+def slot_layout(keys_by_backend):
+    """(videos, first_frame, base, n_slots) shared by all the backends.
+
+    `keys_by_backend` maps backend name to {column: array} for KEY_COLUMNS.
+    Video i owns slots base[i] .. base[i] + (last - first frame).
+    """
+    video_ids = [np.asarray(keys['video_id']) for keys in keys_by_backend.values()]
+    videos = np.unique(np.concatenate(video_ids))
+    first = np.full(len(videos), np.iinfo(np.int64).max, dtype=np.int64)
+    last = np.full(len(videos), -1, dtype=np.int64)
+    for keys in keys_by_backend.values():
+        video = np.searchsorted(videos, keys['video_id'])
+        frame = np.asarray(keys['frame'], dtype=np.int64)
+        np.minimum.at(first, video, frame)
+        np.maximum.at(last, video, frame)
+
+    sizes = np.maximum(last - first + 1, 0)
+    base = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+    return videos, first, base, int(sizes.sum())
+
+def frame_slots(keys, layout):
+    """Slot of every row of one backend."""
+    videos, first, base, _ = layout
+    video = np.searchsorted(videos, keys['video_id'])
+    return base[video] + np.asarray(keys['frame'], dtype=np.int64) - first[video]
+
+def dense_rows(slots, n_slots):
+    """Row number per slot (-1 where the backend has no frame) and the validity mask."""
+    rows = np.full(n_slots, -1, dtype=np.int64)
+    rows[slots] = np.arange(len(slots), dtype=np.int64)
+    return rows, rows >= 0
+
+def align_frames(keys_by_backend):
+    """Rows of each backend that hold the frames common to all of them.
+
+    Returns ({backend: row numbers}, common keys DataFrame). A frame only
+    counts when every backend also agrees on its window_id, as with a join on
+    all three key columns.
+    """
+    layout = slot_layout(keys_by_backend)
+    n_slots = layout[3]
+
+    dense = {}
+    common = np.ones(n_slots, dtype=bool)
+    for name, keys in keys_by_backend.items():
+        dense[name], valid = dense_rows(frame_slots(keys, layout), n_slots)
+        common &= valid
+
+    slots = np.flatnonzero(common)
+    rows = {name: backend_rows[slots] for name, backend_rows in dense.items()}
+
+    reference, *others = keys_by_backend
+    windows = np.asarray(keys_by_backend[reference]['window_id'])[rows[reference]]
+    agree = np.ones(len(slots), dtype=bool)
+    for name in others:
+        agree &= np.asarray(keys_by_backend[name]['window_id'])[rows[name]] == windows
+    if not agree.all():
+        rows = {name: backend_rows[agree] for name, backend_rows in rows.items()}
+
+    df_common = pd.DataFrame({column: np.asarray(keys_by_backend[reference][column])[rows[reference]]
+                              for column in KEY_COLUMNS})
+    return rows, df_common
+
+def gather_features(features, rows):
+    """The aligned float32 feature matrix of one backend, in a single gather."""
+    return np.take(features, rows, axis=0).astype(np.float32, copy=False)
@@ -0,0 +1,161 @@
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+
+class FrameRing:
+    """Fixed-slot ring of decoded frames in shared memory.
+
+    One producer writes frames in order into slot `seq % n_slots`; every
+    consumer reads all frames in the same order as NumPy views of the slot,
+    without copying. A slot is reused only once all consumers have released
+    it, so a slow consumer makes the producer wait (backpressure) instead of
+    frames being dropped or piling up in memory.
+
+    Create it in the producer, pass `spec()` to each consumer process and
+    call `FrameRing.attach(spec, cond)` there. The condition can only reach
+    another process when it is started, so long-lived consumers receive it
+    once at start-up and every ring they read is created with `cond=` that
+    same condition; the shared memory is attached by name.
+    """
+
+    # header fields after the per-slot arrays
+    _WRITE_SEQ, _CLOSED, _MAX_OCCUPANCY, _OCCUPANCY_SUM = range(4)
+
+    def __init__(self, n_slots, frame_shape, n_consumers, ctx=None, cond=None, _spec=None):
+        self.n_slots = n_slots
+        self.frame_shape = tuple(frame_shape)
+        self.n_consumers = n_consumers
+
+        if _spec is None:
+            ctx = ctx or multiprocessing.get_context("spawn")
+            self._cond = cond if cond is not None else ctx.Condition()
+            self._frames_shm = shared_memory.SharedMemory(
+                create=True, size=int(np.prod((n_slots,) + self.frame_shape)))
+            self._header_shm = shared_memory.SharedMemory(create=True, size=self._header_size())
+            self._owner = True
+        else:
+            frames_name, header_name = _spec
+            self._cond = cond
+            self._frames_shm = shared_memory.SharedMemory(name=frames_name)
+            self._header_shm = shared_memory.SharedMemory(name=header_name)
+            self._owner = False
+
+        self.slots = np.ndarray((n_slots,) + self.frame_shape, dtype=np.uint8, buffer=self._frames_shm.buf)
+        header = np.ndarray(self._header_size() // 8, dtype=np.int64, buffer=self._header_shm.buf)
+        self._refcount = header[:n_slots]
+        self._frame_index = header[n_slots:2 * n_slots]
+        self._fields = header[2 * n_slots:2 * n_slots + 4]
+        # seconds spent waiting: [producer, consumer 0, consumer 1, ...]
+        self._waits = np.ndarray(1 + n_consumers, dtype=np.float64, buffer=self._header_shm.buf,
+                                 offset=8 * (2 * n_slots + 4))
+        if self._owner:
+            header[:] = 0
+            self._waits[:] = 0.0
+
+        self._read_seq = 0
+
+    def _header_size(self):
+        return 8 * (2 * self.n_slots + 4 + 1 + self.n_consumers)
+
+    def spec(self):
+        """Picklable handle, also through a queue; see attach()."""
+        return (self.n_slots, self.frame_shape, self.n_consumers,
+                (self._frames_shm.name, self._header_shm.name))
+
+    @classmethod
+    def attach(cls, spec, cond):
+        n_slots, frame_shape, n_consumers, names = spec
+        return cls(n_slots, frame_shape, n_consumers, cond=cond, _spec=names)
+
+    def _occupancy(self):
+        return int(np.count_nonzero(self._refcount))
+
+    # ---------- producer ----------
+    def put(self, frame, frame_index, timeout=None):
+        """Copy a frame into the next slot; returns False if it stayed full for `timeout` seconds."""
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"Frame has shape {frame.shape}, ring holds {self.frame_shape}")
+
+        with self._cond:
+            slot = int(self._fields[self._WRITE_SEQ] % self.n_slots)
+            start = time.perf_counter()
+            ready = self._cond.wait_for(lambda: self._refcount[slot] == 0, timeout)
+            self._waits[0] += time.perf_counter() - start
+            if not ready:
+                return False
+
+        # Consumers do not look at the slot until WRITE_SEQ moves past it, so
+        # the copy can happen outside the lock.
+        self.slots[slot] = frame
+
+        with self._cond:
+            self._frame_index[slot] = frame_index
+            self._refcount[slot] = self.n_consumers
+            self._fields[self._WRITE_SEQ] += 1
+            occupancy = self._occupancy()
+            self._fields[self._MAX_OCCUPANCY] = max(self._fields[self._MAX_OCCUPANCY], occupancy)
+            self._fields[self._OCCUPANCY_SUM] += occupancy
+            self._cond.notify_all()
+        return True
+
+    def close(self):
+        """No more frames: readers stop once they have consumed the rest."""
+        with self._cond:
+            self._fields[self._CLOSED] = 1
+            self._cond.notify_all()
+
+    # ---------- consumers ----------
+    def release(self, slot):
+        with self._cond:
+            self._refcount[slot] -= 1
+            if self._refcount[slot] == 0:
+                self._cond.notify_all()
+
+    def reader(self, consumer, timeout=None):
+        """Yield (frame_index, frame_view, release) for every frame, in order.
+
+        The view is only valid until release() is called; consumers that
+        batch frames simply call it after the batch has run.
+        """
+        while True:
+            with self._cond:
+                start = time.perf_counter()
+                ready = self._cond.wait_for(
+                    lambda: self._fields[self._WRITE_SEQ] > self._read_seq or self._fields[self._CLOSED],
+                    timeout
+                )
+                self._waits[1 + consumer] += time.perf_counter() - start
+                if not ready:
+                    raise TimeoutError(f"No frame for consumer {consumer} within {timeout}s")
+                if self._fields[self._WRITE_SEQ] <= self._read_seq:
+                    return
+                slot = self._read_seq % self.n_slots
+                frame_index = int(self._frame_index[slot])
+
+            self._read_seq += 1
+            yield frame_index, self.slots[slot], lambda slot=slot: self.release(slot)
+
+    # ---------- metrics / cleanup ----------
+    def metrics(self):
+        with self._cond:
+            frames = int(self._fields[self._WRITE_SEQ])
+            return {
+                "slots": self.n_slots,
+                "frames": frames,
+                "occupancy": self._occupancy(),
+                "max_occupancy": int(self._fields[self._MAX_OCCUPANCY]),
+                "mean_occupancy": round(float(self._fields[self._OCCUPANCY_SUM]) / frames, 2) if frames else 0.0,
+                "producer_wait_s": round(float(self._waits[0]), 3),
+                "consumer_wait_s": [round(float(w), 3) for w in self._waits[1:]]
+            }
+
+    def close_shm(self):
+        """Detach from the shared memory; the creating process also frees it."""
+        del self.slots, self._refcount, self._frame_index, self._fields, self._waits
+        self._frames_shm.close()
+        self._header_shm.close()
+        if self._owner:
+            self._frames_shm.unlink()
+            self._header_shm.unlink()
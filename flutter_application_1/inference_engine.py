@@ -0,0 +1,77 @@
+import threading
+import time
+import numpy as np
+import tensorflow as tf
+import metrics
+
+
+class FusedEnsemble:
+    """The three GRU models fused into one multi-input Keras graph.
+
+    One call runs all heads in a single traced tf.function, so the ensemble pays
+    the Keras/TensorFlow dispatch overhead once instead of three times and the
+    runtime can schedule the three independent GRUs in parallel.
+    """
+
+    def __init__(self, models, batch_size=256):
+        self.names = list(models)
+        self.models = models
+        self.batch_size = batch_size
+
+        inputs = [
+            tf.keras.Input(shape=models[name].input_shape[1:], name=f"{name}_sequences")
+            for name in self.names
+        ]
+        outputs = []
+        for name, model_input in zip(self.names, inputs):
+            outputs.extend(models[name](model_input, training=False))
+        self.model = tf.keras.Model(inputs=inputs, outputs=outputs, name="fused_ensemble")
+
+        self._forward = tf.function(lambda *xs: self.model(list(xs), training=False),
+                                    reduce_retracing=True)
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def _record(self, batch_size, seconds):
+        metrics.gru_batch_seconds.observe(seconds, engine="keras")
+        metrics.gru_batch_sequences.inc(batch_size, engine="keras")
+        with self._lock:
+            s = self.stats.setdefault(batch_size, {"calls": 0, "sequences": 0, "seconds": 0.0})
+            s["calls"] += 1
+            s["sequences"] += batch_size
+            s["seconds"] += seconds
+
+    def predict_raw(self, X_tests):
+        """Return {name: (movement, knee_probs, elbow_probs)} as NumPy arrays."""
+        xs = [np.asarray(X_tests[name], dtype=np.float32) for name in self.names]
+        n = len(xs[0])
+        if any(len(x) != n for x in xs):
+            raise ValueError("All models need the same number of sequences")
+
+        chunks = []
+        for start in range(0, n, self.batch_size):
+            batch = [x[start:start + self.batch_size] for x in xs]
+            t0 = time.perf_counter()
+            outputs = self._forward(*batch)
+            outputs = [o.numpy() for o in outputs]
+            self._record(len(batch[0]), time.perf_counter() - t0)
+            chunks.append(outputs)
+
+        if chunks:
+            merged = [np.concatenate([c[i] for c in chunks]) for i in range(len(chunks[0]))]
+        else:
+            merged = [np.zeros((0,) + tuple(shape[1:]), dtype=np.float32) for shape in self.model.output_shape]
+
+        return {name: tuple(merged[3 * i:3 * i + 3]) for i, name in enumerate(self.names)}
+
+    def report(self):
+        """Latency and throughput per batch size seen so far."""
+        with self._lock:
+            return {
+                batch_size: {
+                    "calls": s["calls"],
+                    "mean_latency_ms": round(1000 * s["seconds"] / s["calls"], 3),
+                    "sequences_per_sec": round(s["sequences"] / s["seconds"], 1) if s["seconds"] else None
+                }
+                for batch_size, s in sorted(self.stats.items())
+            }
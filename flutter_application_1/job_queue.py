@@ -0,0 +1,140 @@
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+import metrics
+
+
+# Every job reads and writes only inside its own workspace, so several videos
+# can be processed at once.
+JOB_WORKERS = 2
+
+# Write the intermediate extractor and test_*_dataset.csv tables into the
+# workspace as well. Only needed when debugging the pipeline.
+EXPORT_DEBUG_CSV = False
+
+
+def run_job(video_path, workspace):
+    """Extraction, standardisation and ensemble prediction for one video.
+
+    Runs inside a worker process; the heavy modules are imported (by the
+    pipeline) here so each worker loads its models once and keeps them for
+    the following jobs.
+    """
+    from pipeline import run_video_pipeline
+
+    # the worker's metrics of this job only, merged by the parent in _finish
+    metrics.registry.reset()
+    df_output, timings = run_video_pipeline(video_path, workspace, export_csv=EXPORT_DEBUG_CSV)
+    return {
+        "predictions": df_output.to_dict(orient='records'),
+        "timings": timings,
+        "metrics": metrics.registry.snapshot()
+    }
+
+
+class JobQueue:
+    """Runs uploaded videos through the pipeline on a pool of worker processes."""
+
+    def __init__(self, workers=JOB_WORKERS):
+        # Spawn rather than fork: the parent may already hold TensorFlow/torch
+        # thread pools, which do not survive a fork.
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        self._jobs = {}
+        self._lock = threading.Lock()
+        metrics.register_queue("jobs", self.pending)
+
+    def submit(self, video_path, workspace):
+        with self._lock:
+            # The same video is already being processed in this workspace:
+            # hand back that job instead of racing it on the same files.
+            for job in self._jobs.values():
+                if job["workspace"] == workspace and job["finished_at"] is None:
+                    return job["job_id"]
+
+            job_id = uuid.uuid4().hex
+            job = {
+                "job_id": job_id,
+                "video": video_path,
+                "workspace": workspace,
+                "submitted_at": time.time(),
+                "finished_at": None,
+                "result": None,
+                "error": None
+            }
+            self._jobs[job_id] = job
+            job["future"] = self._executor.submit(run_job, video_path, workspace)
+
+        job["future"].add_done_callback(lambda f, job_id=job_id: self._finish(job_id, f))
+        return job_id
+
+    def _finish(self, job_id, future):
+        with self._lock:
+            job = self._jobs[job_id]
+            job["finished_at"] = time.time()
+            if future.exception() is not None:
+                job["error"] = repr(future.exception())
+            else:
+                job["result"] = future.result()
+                metrics.registry.merge(job["result"].pop("metrics", {}))
+
+    def pending(self):
+        """Jobs submitted but not finished yet."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["finished_at"] is None)
+
+    def status(self, job_id, include_result=True):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+
+            future = job.get("future")
+            if job["error"] is not None:
+                state = "failed"
+            elif job["finished_at"] is not None:
+                state = "done"
+            elif future is not None and future.running():
+                state = "running"
+            else:
+                state = "queued"
+
+            status = {
+                "job_id": job_id,
+                "status": state,
+                "video": job["video"],
+                "workspace": job["workspace"],
+                "submitted_at": job["submitted_at"],
+                "finished_at": job["finished_at"]
+            }
+            if job["error"] is not None:
+                status["error"] = job["error"]
+            if include_result and job["result"] is not None:
+                status["result"] = job["result"]
+            return status
+
+    def list(self):
+        with self._lock:
+            job_ids = list(self._jobs)
+        return [self.status(job_id, include_result=False) for job_id in job_ids]
+
+    def events(self, job_id, interval=0.5):
+        """Yield the job status every time it changes, until it finishes."""
+        last_state = None
+        while True:
+            status = self.status(job_id)
+            if status is None:
+                return
+            if status["status"] != last_state:
+                last_state = status["status"]
+                yield status
+            if last_state in ("done", "failed"):
+                return
+            time.sleep(interval)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
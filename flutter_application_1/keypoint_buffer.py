@@ -0,0 +1,51 @@
+import numpy as np
+
+
+class KeypointBuffer:
+    """Growable (frames, joints, 3) float32 array of per-frame keypoints.
+
+    Extractors write each frame's joints straight into the next free slot and
+    commit it with its frame index; frames without a detection are simply not
+    committed. Storage grows in chunks so long videos never reallocate per frame.
+    """
+
+    def __init__(self, n_joints=8, chunk_size=1024):
+        self.chunk_size = chunk_size
+        self.keypoints = np.zeros((chunk_size, n_joints, 3), dtype=np.float32)
+        self.frames = np.zeros(chunk_size, dtype=np.int32)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, n):
+        if self.size + n <= len(self.frames):
+            return
+        capacity = len(self.frames)
+        while capacity < self.size + n:
+            capacity += self.chunk_size
+        keypoints = np.zeros((capacity,) + self.keypoints.shape[1:], dtype=np.float32)
+        keypoints[:self.size] = self.keypoints[:self.size]
+        frames = np.zeros(capacity, dtype=np.int32)
+        frames[:self.size] = self.frames[:self.size]
+        self.keypoints, self.frames = keypoints, frames
+
+    def next_slot(self):
+        """View of the next free (joints, 3) row; call commit() to keep it."""
+        self._reserve(1)
+        return self.keypoints[self.size]
+
+    def commit(self, frame_index):
+        self.frames[self.size] = frame_index
+        self.size += 1
+
+    def extend(self, frame_indices, keypoints):
+        n = len(frame_indices)
+        self._reserve(n)
+        self.frames[self.size:self.size + n] = frame_indices
+        self.keypoints[self.size:self.size + n] = keypoints
+        self.size += n
+
+    def data(self):
+        """(frames, keypoints) views of the committed rows."""
+        return self.frames[:self.size], self.keypoints[:self.size]
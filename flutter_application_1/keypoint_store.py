@@ -0,0 +1,100 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+
+# Binary on-disk format for standardised per-frame keypoints, one directory
+# per backend:
+#   video_id.npy, frame.npy, window_id.npy   int32, one value per row
+#   features.npy                             float32, (rows, len(FEATURE_COLUMNS))
+#   schema.json                              column names, format version and
+#                                            the extraction settings
+# The features live in one row-major matrix so a window of consecutive frames
+# is a contiguous slice of a memory-mapped file.
+
+STORE_VERSION = 1
+KEY_COLUMNS = ['video_id', 'frame', 'window_id']
+FEATURE_COLUMNS = [
+    'left_shoulder_x', 'left_shoulder_y', 'left_shoulder_confidence',
+    'right_shoulder_x', 'right_shoulder_y', 'right_shoulder_confidence',
+    'left_elbow_x', 'left_elbow_y', 'left_elbow_confidence',
+    'right_elbow_x', 'right_elbow_y', 'right_elbow_confidence',
+    'left_hip_x', 'left_hip_y', 'left_hip_confidence',
+    'right_hip_x', 'right_hip_y', 'right_hip_confidence',
+    'left_knee_x', 'left_knee_y', 'left_knee_confidence',
+    'right_knee_x', 'right_knee_y', 'right_knee_confidence'
+]
+STORE_FOLDER = "keypoints"
+
+
+def _save_array(path, array):
+    # Write next to the target and rename, so readers never see half a file.
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+def store_dir(workdir, name):
+    return os.path.join(workdir, STORE_FOLDER, name)
+
+def has_keypoints(workdir, name):
+    return os.path.exists(os.path.join(store_dir(workdir, name), "schema.json"))
+
+def save_keypoints(workdir, name, df, extraction=None):
+    """Write one standardised backend table (see standardize_backends).
+
+    `extraction` records how the keypoints were sampled: target_fps,
+    downscale and the resulting stride in source frames.
+    """
+    directory = store_dir(workdir, name)
+    os.makedirs(directory, exist_ok=True)
+
+    for column in KEY_COLUMNS:
+        _save_array(os.path.join(directory, f"{column}.npy"),
+                    df[column].to_numpy(dtype=np.int32))
+    features = df.reindex(columns=FEATURE_COLUMNS).to_numpy(dtype=np.float32)
+    _save_array(os.path.join(directory, "features.npy"), np.ascontiguousarray(features))
+
+    # schema.json is written last and marks the store as complete
+    schema = {
+        "version": STORE_VERSION,
+        "rows": len(df),
+        "key_columns": KEY_COLUMNS,
+        "feature_columns": FEATURE_COLUMNS,
+        "extraction": extraction or {}
+    }
+    with open(os.path.join(directory, "schema.json.tmp"), "w") as f:
+        json.dump(schema, f)
+    os.replace(os.path.join(directory, "schema.json.tmp"), os.path.join(directory, "schema.json"))
+    return directory
+
+def load_extraction(workdir, name):
+    """Extraction settings of a stored backend; {} means full rate, full resolution."""
+    with open(os.path.join(store_dir(workdir, name), "schema.json")) as f:
+        return json.load(f).get("extraction", {})
+
+def load_keypoints(workdir, name, mmap=True):
+    """Return (keys, features) for one backend.
+
+    `keys` maps each of KEY_COLUMNS to an int32 array and `features` is the
+    float32 matrix; with mmap=True nothing is read until it is sliced.
+    """
+    directory = store_dir(workdir, name)
+    with open(os.path.join(directory, "schema.json")) as f:
+        schema = json.load(f)
+    if schema["version"] != STORE_VERSION or schema["feature_columns"] != FEATURE_COLUMNS:
+        raise ValueError(f"Unsupported keypoint store in {directory}")
+
+    mmap_mode = "r" if mmap else None
+    keys = {column: np.load(os.path.join(directory, f"{column}.npy"), mmap_mode=mmap_mode)
+            for column in KEY_COLUMNS}
+    features = np.load(os.path.join(directory, "features.npy"), mmap_mode=mmap_mode)
+    return keys, features
+
+def load_keypoint_frame(workdir, name):
+    """Read one backend back as a DataFrame with the standard columns."""
+    keys, features = load_keypoints(workdir, name, mmap=False)
+    df = pd.DataFrame(features, columns=FEATURE_COLUMNS)
+    for i, column in enumerate(KEY_COLUMNS):
+        df.insert(i, column, keys[column])
+    return df
@@ -5,7 +5,10 @@ import 'package:fl_chart/fl_chart.dart';
 import 'video_player_widget.dart';
 
 class PredictionPage extends StatefulWidget {
-  const PredictionPage({super.key});
+  const PredictionPage({super.key, this.videoHash});
+
+  // Workspace of an uploaded video; without it the latest results are shown
+  final String? videoHash;
 
   @override
   State<PredictionPage> createState() => _PredictionPageState();
@@ -26,8 +29,10 @@ class _PredictionPageState extends State<PredictionPage> {
 
   Future<void> fetchPredictionData() async {
     try {
-      final response =
-          await http.get(Uri.parse('http://localhost:8080/predict'));
+      final url = widget.videoHash != null
+          ? 'http://localhost:8080/predict/${widget.videoHash}'
+          : 'http://localhost:8080/predict';
+      final response = await http.get(Uri.parse(url));
 
       if (response.statusCode == 200) {
         final List<dynamic> data = json.decode(response.body);
@@ -1,9 +1,30 @@
 import 'package:flutter/material.dart';
 import 'dart:html' as html;
 import 'dart:async';
+import 'dart:convert';
+import 'dart:math';
+import 'dart:typed_data';
+import 'package:crypto/crypto.dart';
 import 'package:http/http.dart' as http;
 import 'predictions_page.dart';
 
+// העלאה בחלקים שאפשר להמשיך מאותה נקודה אחרי ניתוק
+const String uploadServer = 'http://localhost:5000';
+const int uploadChunkSize = 8 * 1024 * 1024;
+const int uploadMaxAttempts = 5;
+
+class _DigestSink implements Sink<Digest> {
+  Digest? value;
+
+  @override
+  void add(Digest data) {
+    value = data;
+  }
+
+  @override
+  void close() {}
+}
+
 class UploadVideoPage extends StatefulWidget {
   const UploadVideoPage({super.key});
 
@@ -15,6 +36,7 @@ class _UploadVideoPageState extends State<UploadVideoPage>
     with SingleTickerProviderStateMixin {
   String? _videoFileName;
   bool _isLoading = false;
+  double? _uploadProgress;
 
   late AnimationController _controller;
   late Animation<Offset> _offsetAnimation;
@@ -60,63 +82,163 @@ class _UploadVideoPageState extends State<UploadVideoPage>
     });
   }
 
-  Future<void> sendVideoToMultipleServers(html.File file) async {
-    setState(() {
-      _isLoading = true;
-    });
-
+  Future<Uint8List> _readSlice(html.File file, int start, int end) {
     final reader = html.FileReader();
-    final completer = Completer<List<int>>();
-    reader.readAsArrayBuffer(file);
+    final completer = Completer<Uint8List>();
 
     reader.onLoadEnd.listen((e) {
-      completer.complete(reader.result as List<int>);
+      completer.complete(reader.result as Uint8List);
     });
 
     reader.onError.listen((e) {
       completer.completeError(Exception("Failed to read file"));
     });
 
-    try {
-      final bytes = await completer.future;
-
-      final uris = [
-        Uri.parse('http://localhost:5000/upload/movenet'),
-        Uri.parse('http://localhost:5000/upload/yolo'),
-        Uri.parse('http://localhost:5000/upload/mediapipe'),
-      ];
-
-      for (final uri in uris) {
-        final request = http.MultipartRequest('POST', uri);
-        request.files.add(http.MultipartFile.fromBytes(
-          'file',
-          bytes,
-          filename: file.name,
-        ));
-
-        try {
-          final response = await request.send();
-          if (response.statusCode == 200) {
-            print('Uploaded to $uri successfully');
-          } else {
-            print('Upload to $uri failed: ${response.statusCode}');
-          }
-        } catch (e) {
-          print('Error uploading to $uri: $e');
+    reader.readAsArrayBuffer(file.slice(start, end));
+    return completer.future;
+  }
+
+  String _uploadKey(html.File file) =>
+      'upload:${file.name}:${file.size}:${file.lastModified}';
+
+  // Resumes the upload of the same file if the server still has it
+  Future<String> _startOrResumeUpload(html.File file) async {
+    final savedId = html.window.localStorage[_uploadKey(file)];
+    if (savedId != null) {
+      final response =
+          await http.get(Uri.parse('$uploadServer/uploads/$savedId'));
+      if (response.statusCode == 200 &&
+          json.decode(response.body)['state'] == 'uploading') {
+        return savedId;
+      }
+    }
+
+    final response = await http.post(
+      Uri.parse('$uploadServer/uploads'),
+      headers: {'Content-Type': 'application/json'},
+      body: json.encode({'filename': file.name, 'size': file.size}),
+    );
+    if (response.statusCode != 201) {
+      throw Exception('Could not start upload: ${response.statusCode}');
+    }
+    final uploadId = json.decode(response.body)['upload_id'] as String;
+    html.window.localStorage[_uploadKey(file)] = uploadId;
+    return uploadId;
+  }
+
+  Future<Map<String, dynamic>> _uploadStatus(String uploadId) async {
+    final response = await http.get(Uri.parse('$uploadServer/uploads/$uploadId'));
+    if (response.statusCode != 200) {
+      throw Exception('Upload status failed: ${response.statusCode}');
+    }
+    return json.decode(response.body) as Map<String, dynamic>;
+  }
+
+  Future<int> _putChunk(String uploadId, int offset, List<int> chunk) async {
+    for (var attempt = 1;; attempt++) {
+      try {
+        final response = await http.put(
+          Uri.parse('$uploadServer/uploads/$uploadId?offset=$offset'),
+          headers: {
+            'Content-Type': 'application/octet-stream',
+            'X-Chunk-Sha256': sha256.convert(chunk).toString(),
+          },
+          body: chunk,
+        );
+        final body = json.decode(response.body);
+        if (response.statusCode == 200) {
+          return body['offset'] as int;
+        }
+        // the previous attempt arrived but its response was lost
+        if (response.statusCode == 409 &&
+            body['offset'] == offset + chunk.length) {
+          return body['offset'] as int;
         }
+        throw Exception('Chunk upload failed: ${response.statusCode}');
+      } catch (e) {
+        if (attempt >= uploadMaxAttempts) rethrow;
+        print('Retrying chunk at $offset after error: $e');
+        await Future.delayed(Duration(seconds: 2 * attempt));
+      }
+    }
+  }
+
+  Future<String> _uploadInChunks(html.File file) async {
+    final uploadId = await _startOrResumeUpload(file);
+    var offset = (await _uploadStatus(uploadId))['offset'] as int;
+
+    final digest = _DigestSink();
+    final hashInput = sha256.startChunkedConversion(digest);
+
+    for (var start = 0; start < file.size; start += uploadChunkSize) {
+      final end = min(start + uploadChunkSize, file.size);
+      final bytes = await _readSlice(file, start, end);
+      hashInput.add(bytes);
+
+      // already on the server from an earlier attempt
+      if (end <= offset) continue;
+      final chunk = start < offset ? bytes.sublist(offset - start) : bytes;
+      offset = await _putChunk(uploadId, offset, chunk);
+
+      if (mounted) {
+        setState(() {
+          _uploadProgress = offset / file.size;
+        });
+      }
+    }
+    hashInput.close();
+
+    final response = await http.post(
+      Uri.parse('$uploadServer/uploads/$uploadId/complete'),
+      headers: {'Content-Type': 'application/json'},
+      body: json.encode({'sha256': digest.value.toString()}),
+    );
+    html.window.localStorage.remove(_uploadKey(file));
+    if (response.statusCode != 202) {
+      throw Exception('Upload verification failed: ${response.body}');
+    }
+    return uploadId;
+  }
+
+  Future<void> sendVideoToMultipleServers(html.File file) async {
+    setState(() {
+      _isLoading = true;
+      _uploadProgress = 0;
+    });
+
+    try {
+      // השרת מתחיל לחלץ נקודות מפתח כבר מהחלקים הראשונים כשהפורמט מאפשר
+      final uploadId = await _uploadInChunks(file);
+      if (mounted) {
+        setState(() {
+          _uploadProgress = null;
+        });
+      }
+
+      var status = await _uploadStatus(uploadId);
+      while (status['state'] == 'processing') {
+        await Future.delayed(const Duration(seconds: 2));
+        status = await _uploadStatus(uploadId);
+      }
+      if (status['state'] != 'done') {
+        throw Exception('Processing failed: ${status['error']}');
       }
 
       if (mounted) {
         Navigator.of(context).push(
-          MaterialPageRoute(builder: (context) => const PredictionPage()),
+          MaterialPageRoute(
+            builder: (context) =>
+                PredictionPage(videoHash: status['workspace'] as String),
+          ),
         );
       }
     } catch (e) {
-      print("Error reading file: $e");
+      print("Error uploading video: $e");
     } finally {
       if (mounted) {
         setState(() {
           _isLoading = false;
+          _uploadProgress = null;
         });
       }
     }
@@ -305,10 +427,12 @@ class _UploadVideoPageState extends State<UploadVideoPage>
                         padding: const EdgeInsets.all(16.0),
                         child: Row(
                           mainAxisAlignment: MainAxisAlignment.center,
-                          children: const [
-                            CircularProgressIndicator(),
-                            SizedBox(width: 16),
-                            Text("Processing video, please wait..."),
+                          children: [
+                            CircularProgressIndicator(value: _uploadProgress),
+                            const SizedBox(width: 16),
+                            Text(_uploadProgress != null
+                                ? "Uploading video ${(_uploadProgress! * 100).toStringAsFixed(0)}%..."
+                                : "Processing video, please wait..."),
                           ],
                         ),
                       ),
@@ -0,0 +1,293 @@
+import os
+import resource
+import threading
+from contextlib import contextmanager
+
+
+# In-process metrics for the pipeline, rendered in the Prometheus text
+# exposition format (version 0.0.4) on the /metrics routes. Counters and
+# histograms only ever grow; gauges are set directly or read from a callback
+# when the metrics are collected. Job worker processes keep their own
+# registry and send a snapshot back with every job result, which the parent
+# merges into its own (see job_queue.run_job).
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from a single TFLite frame up to a whole video.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+MEMORY_BUCKETS = tuple(2 ** i * 1024 ** 2 for i in range(7, 16))  # 128 MiB .. 32 GiB
+
+# How often track_peak_memory() samples the resident set size.
+MEMORY_SAMPLE_SECONDS = 0.05
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self.samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def merge(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        # callback() returns {label tuple: value}, read at collection time
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception:
+                values = {}
+            with self._lock:
+                self._values = {tuple(str(v) for v in key): value for key, value in values.items()}
+        return super().samples()
+
+    def merge(self, values):
+        with self._lock:
+            self._values.update(values)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, count=1, **labels):
+        """Record `count` observations of `value` (e.g. every frame of a batch)."""
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["buckets"][i] += count
+                    break
+            entry["sum"] += value * count
+            entry["count"] += count
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, entry["buckets"]):
+                    cumulative += n
+                    samples.append((f"{self.name}_bucket", key, (("le", _format_value(bound)),), cumulative))
+                samples.append((f"{self.name}_sum", key, (), entry["sum"]))
+                samples.append((f"{self.name}_count", key, (), entry["count"]))
+        return samples
+
+    def snapshot(self):
+        with self._lock:
+            return {key: {"buckets": list(e["buckets"]), "sum": e["sum"], "count": e["count"]}
+                    for key, e in self._values.items()}
+
+    def merge(self, values):
+        with self._lock:
+            for key, other in values.items():
+                entry = self._values.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+                entry["buckets"] = [a + b for a, b in zip(entry["buckets"], other["buckets"])]
+                entry["sum"] += other["sum"]
+                entry["count"] += other["count"]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        gauge = self._register(Gauge, name, documentation, labelnames)
+        if callback is not None:
+            gauge.callback = callback
+        return gauge
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+    def snapshot(self):
+        """Current values, to be merged into another process' registry.
+
+        Gauges read from a callback describe this process only and are left out.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics
+                if not (isinstance(metric, Gauge) and metric.callback is not None)}
+
+    def merge(self, snapshot):
+        with self._lock:
+            metrics = dict(self._metrics)
+        for name, values in snapshot.items():
+            if name in metrics:
+                metrics[name].merge(values)
+
+    def reset(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            if not isinstance(metric, Gauge):
+                metric.reset()
+
+
+registry = MetricsRegistry()
+
+
+# ---------- Pipeline metrics ----------
+decode_seconds = registry.counter(
+    "video_decode_seconds_total", "Time spent reading, grabbing and resizing video frames")
+decoded_frames = registry.counter(
+    "video_decoded_frames_total", "Sampled video frames handed to the extractors")
+backend_inference_seconds = registry.histogram(
+    "backend_inference_seconds_per_frame", "Pose model inference time per frame", ["backend"])
+backend_fps = registry.gauge(
+    "backend_frames_per_second", "Inference throughput of the last video, per backend", ["backend"])
+stage_seconds = registry.histogram(
+    "pipeline_stage_seconds", "Duration of each pipeline stage (extraction, standardisation, ...)", ["stage"])
+gru_batch_seconds = registry.histogram(
+    "gru_batch_seconds", "Latency of one ensemble forward pass", ["engine"])
+gru_batch_sequences = registry.counter(
+    "gru_sequences_total", "Sequences scored by the ensemble", ["engine"])
+gru_queue_wait_seconds = registry.histogram(
+    "gru_queue_wait_seconds", "Time a request waited in the micro-batching queue")
+cache_lookups = registry.counter(
+    "result_cache_lookups_total", "Result cache lookups", ["kind", "result"])
+job_peak_memory = registry.histogram(
+    "job_peak_memory_bytes", "Peak resident memory of the process while a video was processed",
+    buckets=MEMORY_BUCKETS)
+
+
+# queue name -> callback() returning its current depth
+_queue_depths = {}
+
+def register_queue(queue, depth):
+    """Report `depth()` as the depth of `queue` whenever the metrics are collected."""
+    _queue_depths[queue] = depth
+
+queue_depth = registry.gauge(
+    "queue_depth", "Items waiting in each queue", ["queue"],
+    callback=lambda: {(queue,): depth() for queue, depth in list(_queue_depths.items())})
+
+
+# ---------- Memory ----------
+def current_rss():
+    """Resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # peak since the process started (kilobytes on Linux), not current
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+@contextmanager
+def track_peak_memory(interval=MEMORY_SAMPLE_SECONDS):
+    """Sample the RSS on a thread while the block runs; records the peak as one job."""
+    peak = [current_rss()]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(interval):
+            peak[0] = max(peak[0], current_rss())
+
+    sampler = threading.Thread(target=sample, name="memory-sampler", daemon=True)
+    sampler.start()
+    try:
+        yield peak
+    finally:
+        done.set()
+        sampler.join()
+        peak[0] = max(peak[0], current_rss())
+        job_peak_memory.observe(peak[0])
+
+
+def timed_frames(backend, seconds, frames):
+    """Record `frames` frames of `backend` inference that took `seconds` in all."""
+    if frames:
+        backend_inference_seconds.observe(seconds / frames, count=frames, backend=backend)
+
+def metrics_response():
+    """(body, status, headers) for a Flask /metrics route."""
+    return registry.render(), 200, {"Content-Type": CONTENT_TYPE}
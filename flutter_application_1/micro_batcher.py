@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+import metrics
+
+
+# Dynamic micro-batching in front of an ensemble engine (FusedEnsemble or
+# TFLiteEnsemble). Concurrent callers hand their sequences to one batching
+# thread, which waits up to max_latency_ms after the first request for more
+# to arrive, or until max_batch sequences are queued, then runs a single
+# forward pass and gives every caller its own slice of the outputs. Many
+# short clips scored at once then share the model dispatch overhead.
+
+MAX_BATCH_SEQUENCES = 256
+MAX_LATENCY_MS = 5.0
+
+
+class _Request:
+    def __init__(self, X_tests, size):
+        self.X_tests = X_tests
+        self.size = size
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    def __init__(self, engine, max_batch=MAX_BATCH_SEQUENCES, max_latency_ms=MAX_LATENCY_MS):
+        self.engine = engine
+        self.names = engine.names
+        self.max_batch = max_batch
+        self.max_latency = max_latency_ms / 1000
+        self._queue = deque()
+        self._queued_sequences = 0
+        self._cond = threading.Condition()
+        self.stats = {"requests": 0, "batches": 0, "sequences": 0,
+                      "queue_wait_seconds": 0.0, "max_queue_wait_seconds": 0.0,
+                      "forward_seconds": 0.0, "max_queue_depth": 0}
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+        metrics.register_queue("gru_micro_batch", self.queue_depth)
+
+    def predict_raw(self, X_tests):
+        """Same contract as the engine's predict_raw; blocks until the batch ran."""
+        size = len(X_tests[self.names[0]])
+        if size == 0:
+            return self.engine.predict_raw(X_tests)
+
+        request = _Request(X_tests, size)
+        with self._cond:
+            self._queue.append(request)
+            self._queued_sequences += size
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], len(self._queue))
+            self._cond.notify_all()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._queue)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            # hold the batch open until it is full or the oldest request has
+            # waited max_latency
+            deadline = self._queue[0].enqueued + self.max_latency
+            while self._queued_sequences < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch, size = [], 0
+            while self._queue and (not batch or size + self._queue[0].size <= self.max_batch):
+                request = self._queue.popleft()
+                self._queued_sequences -= request.size
+                batch.append(request)
+                size += request.size
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            try:
+                if len(batch) == 1:
+                    outputs = self.engine.predict_raw(batch[0].X_tests)
+                else:
+                    outputs = self.engine.predict_raw({
+                        name: np.concatenate([request.X_tests[name] for request in batch])
+                        for name in self.names
+                    })
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                continue
+
+            forward = time.perf_counter() - started
+            offset = 0
+            for request in batch:
+                end = offset + request.size
+                request.result = {name: tuple(output[offset:end] for output in outputs[name])
+                                  for name in self.names}
+                offset = end
+
+            waits = [started - request.enqueued for request in batch]
+            for wait in waits:
+                metrics.gru_queue_wait_seconds.observe(wait)
+            with self._cond:
+                self.stats["requests"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["sequences"] += offset
+                self.stats["queue_wait_seconds"] += sum(waits)
+                self.stats["max_queue_wait_seconds"] = max(self.stats["max_queue_wait_seconds"], max(waits))
+                self.stats["forward_seconds"] += forward
+            for request in batch:
+                request.done.set()
+
+    def report(self):
+        with self._cond:
+            s = dict(self.stats)
+            queue_depth = len(self._queue)
+        return {
+            "max_batch": self.max_batch,
+            "max_latency_ms": round(1000 * self.max_latency, 3),
+            "queue_depth": queue_depth,
+            "max_queue_depth": s["max_queue_depth"],
+            "requests": s["requests"],
+            "batches": s["batches"],
+            "requests_per_batch": round(s["requests"] / s["batches"], 2) if s["batches"] else None,
+            "sequences_per_batch": round(s["sequences"] / s["batches"], 1) if s["batches"] else None,
+            "mean_queue_wait_ms": round(1000 * s["queue_wait_seconds"] / s["requests"], 3) if s["requests"] else None,
+            "max_queue_wait_ms": round(1000 * s["max_queue_wait_seconds"], 3),
+            "mean_forward_ms": round(1000 * s["forward_seconds"] / s["batches"], 3) if s["batches"] else None
+        }
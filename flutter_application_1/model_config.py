@@ -0,0 +1,16 @@
+# Model files and settings shared by the extractors, the ensemble server and
+# the result cache, which fingerprints them to tell when cached keypoints or
+# predictions are stale.
+
+MOVENET_MODEL = "models/thunder3.tflite"
+YOLO_MODEL = "models/yolo11n-pose.pt"
+# Source frames per scoring window; window_id = frame // WINDOW_SIZE.
+WINDOW_SIZE = 60
+MEDIAPIPE_OPTIONS = {
+    "min_detection_confidence": 0.5,
+    "min_tracking_confidence": 0.5
+}
+
+
+def ensemble_model_path(name):
+    return f"models/best_{name}_infant_movement_model.keras"
@@ -0,0 +1,100 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ModelRegistry:
+    """Process-wide cache of loaded pose models.
+
+    Each backend is registered with a loader. Thread-safe backends share one
+    instance; the others keep a pool of instances so every concurrent worker
+    thread gets its own warm copy instead of loading a new one per request.
+    """
+
+    def __init__(self):
+        self._specs = {}
+        self._shared = {}
+        self._pools = {}
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def register(self, name, loader, warmup=None, reset=None, thread_safe=False):
+        self._specs[name] = {
+            "loader": loader,
+            "warmup": warmup,
+            "reset": reset,
+            "thread_safe": thread_safe
+        }
+        self._pools[name] = []
+        self.stats[name] = {
+            "instances": 0,
+            "load_seconds": [],
+            "warmup_seconds": []
+        }
+
+    def _load(self, name):
+        spec = self._specs[name]
+
+        start = time.perf_counter()
+        model = spec["loader"]()
+        load_time = time.perf_counter() - start
+
+        warmup_time = 0.0
+        if spec["warmup"] is not None:
+            start = time.perf_counter()
+            spec["warmup"](model)
+            warmup_time = time.perf_counter() - start
+            if spec["reset"] is not None:
+                spec["reset"](model)
+
+        with self._lock:
+            self.stats[name]["instances"] += 1
+            self.stats[name]["load_seconds"].append(round(load_time, 4))
+            self.stats[name]["warmup_seconds"].append(round(warmup_time, 4))
+        print(f"Loaded {name} in {load_time:.2f}s (warm-up {warmup_time:.2f}s)")
+        return model
+
+    def preload(self, names=None):
+        for name in names or list(self._specs):
+            with self.acquire(name):
+                pass
+
+    @contextmanager
+    def acquire(self, name):
+        """Borrow a warm instance of `name` for the duration of a video."""
+        spec = self._specs[name]
+
+        if spec["thread_safe"]:
+            with self._lock:
+                model = self._shared.get(name)
+            if model is None:
+                model = self._load(name)
+                with self._lock:
+                    model = self._shared.setdefault(name, model)
+            yield model
+            return
+
+        with self._lock:
+            model = self._pools[name].pop() if self._pools[name] else None
+        if model is None:
+            model = self._load(name)
+        elif spec["reset"] is not None:
+            spec["reset"](model)
+
+        try:
+            yield model
+        finally:
+            with self._lock:
+                self._pools[name].append(model)
+
+    def report(self):
+        with self._lock:
+            return {
+                name: {
+                    "instances": s["instances"],
+                    "idle": len(self._pools[name]) + (1 if name in self._shared else 0),
+                    "load_seconds": list(s["load_seconds"]),
+                    "warmup_seconds": list(s["warmup_seconds"])
+                }
+                for name, s in self.stats.items()
+            }
@@ -0,0 +1,274 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import uuid
+import numpy as np
+import metrics
+from frame_ring import FrameRing
+
+# Parallel extraction: the parent decodes the video once into a shared-memory
+# FrameRing and every backend runs in its own process, pinned to its own
+# share of the CPU cores, reading the frames from the ring in place. Only the
+# final keypoints go through a queue.
+#
+# The backend processes are started once (ExtractionPool) with their model
+# loaded and warmed, and then serve one video after another. A spawned
+# process imports the parent's __main__ - often a module that imports
+# TensorFlow and torch - before any worker code runs, so it is started
+# already pinned (_start_pinned). The worker then caps the thread pools
+# itself (_limit_threads, set_inference_threads) before loading its model;
+# the parent's environment is never changed.
+
+# Relative share of the cores per backend; YOLO is the most expensive.
+CORE_SHARES = {
+    "movenet": 1,
+    "yolo": 2,
+    "mediapipe": 1
+}
+
+# Decoded frames that can be in flight at once. A batched backend holds a
+# whole batch before releasing any of it, so the ring is grown to at least
+# the biggest batch plus RING_MARGIN slots (see ring_slots).
+FRAME_SLOTS = 48
+RING_MARGIN = 8
+
+# Occupancy and wait times of the ring from the last parallel extraction.
+last_ring_metrics = None
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TF_NUM_INTRAOP_THREADS")
+
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def core_plan(methods, cores=None):
+    """Split the cores between the backends in proportion to CORE_SHARES."""
+    cores = sorted(cores) if cores is not None else available_cores()
+    if len(cores) < len(methods):
+        # not enough cores to go round: give each backend one, shared
+        return {name: [cores[i % len(cores)]] for i, name in enumerate(methods)}
+
+    total = sum(CORE_SHARES.get(name, 1) for name in methods)
+    plan = {}
+    start = 0
+    for i, name in enumerate(methods):
+        remaining = len(methods) - i - 1
+        if remaining == 0:
+            count = len(cores) - start
+        else:
+            count = max(1, round(len(cores) * CORE_SHARES.get(name, 1) / total))
+            count = min(count, len(cores) - start - remaining)
+        plan[name] = cores[start:start + count]
+        start += count
+    return plan
+
+
+def ring_slots(batch_sizes, n_slots=FRAME_SLOTS):
+    """Slots the ring needs so no backend can hold all of them while it fills a batch."""
+    return max(n_slots, max(batch_sizes.values(), default=1) + RING_MARGIN)
+
+
+_start_lock = threading.Lock()
+
+def _start_pinned(process, cores):
+    """Start `process` already pinned to `cores`.
+
+    A spawned process inherits the affinity of the thread that starts it, so
+    the starting thread is pinned for the start only; pid 0 is that thread
+    alone, not the whole server.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        process.start()
+        return
+    with _start_lock:
+        saved_cores = os.sched_getaffinity(0)
+        try:
+            os.sched_setaffinity(0, cores)
+            process.start()
+        finally:
+            os.sched_setaffinity(0, saved_cores)
+
+
+def _limit_threads(cores):
+    """Pin every thread of this process to `cores` and cap the library thread pools.
+
+    Runs first in the worker, before it imports the models. The environment
+    variables are set in the worker only; the parent's stay untouched.
+    """
+    if hasattr(os, "sched_setaffinity"):
+        # threads started while the parent's __main__ was imported included
+        for tid in os.listdir("/proc/self/task") if os.path.isdir("/proc/self/task") else [0]:
+            try:
+                os.sched_setaffinity(int(tid), cores)
+            except OSError:
+                pass  # the thread has exited meanwhile
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(len(cores))
+
+
+def _worker(name, cores, cond, tasks, results):
+    """Load one backend, then extract it from every ring sent through `tasks` until None."""
+    _limit_threads(cores)
+    import allModelspreprocess as extraction
+
+    extraction.set_inference_threads(len(cores))
+    extraction.registry.preload([name])
+
+    for task in iter(tasks.get, None):
+        task_id, ring_spec, consumer, batch_size = task
+        ring = reader = None
+        # this video's metrics only, merged by the parent
+        metrics.registry.reset()
+        try:
+            ring = FrameRing.attach(ring_spec, cond)
+            reader = ring.reader(consumer)
+            buffer = extraction.extract_from_frames(name, reader, batch_size)
+            frame_indices, keypoints = buffer.data()
+            results.put((task_id, name, np.array(frame_indices), np.array(keypoints),
+                         metrics.registry.snapshot(), None))
+        except Exception as e:
+            results.put((task_id, name, None, None, {}, repr(e)))
+            # keep releasing the frames so the producer can stop cleanly
+            if reader is not None:
+                for _, _, release in reader:
+                    release()
+        finally:
+            if ring is not None:
+                ring.close_shm()
+
+
+class ExtractionPool:
+    """One pinned, long-lived process per backend, each with its model loaded.
+
+    Videos are extracted one at a time; each gets its own FrameRing, whose
+    shared memory the workers attach by name.
+    """
+
+    def __init__(self, methods, cores=None):
+        # Spawn rather than fork: the parent may already hold TensorFlow/torch
+        # thread pools, which do not survive a fork.
+        self._ctx = multiprocessing.get_context("spawn")
+        self.methods = list(methods)
+        self.cores = sorted(cores) if cores is not None else available_cores()
+        self.plan = core_plan(self.methods, self.cores)
+        self._cond = self._ctx.Condition()
+        self._results = self._ctx.Queue()
+        self._tasks = {name: self._ctx.Queue() for name in self.methods}
+        self._workers = {
+            name: self._ctx.Process(target=_worker, name=f"extract-{name}", daemon=True,
+                                    args=(name, self.plan[name], self._cond, self._tasks[name], self._results))
+            for name in self.methods
+        }
+        for name, worker in self._workers.items():
+            _start_pinned(worker, self.plan[name])
+        self._lock = threading.Lock()
+
+    def alive(self):
+        return all(worker.is_alive() for worker in self._workers.values())
+
+    def _collect(self, task_id, buffers, errors, timeout):
+        """Take one result of `task_id` off the queue; raises if a worker has died."""
+        from allModelspreprocess import N_JOINTS
+        from keypoint_buffer import KeypointBuffer
+
+        try:
+            result_id, name, frame_indices, keypoints, snapshot, error = self._results.get(timeout=timeout)
+        except queue.Empty:
+            if not self.alive():
+                raise RuntimeError("A parallel extraction worker exited") from None
+            return
+        if result_id != task_id:
+            return  # left over from an earlier video that failed
+        metrics.registry.merge(snapshot)
+        if error is not None:
+            errors[name] = error
+            return
+        buffers[name] = KeypointBuffer(N_JOINTS)
+        buffers[name].extend(frame_indices, keypoints)
+
+    def extract(self, video_path, methods, batch_sizes, target_fps=None, downscale=None):
+        """Keypoint tables of `methods` (a subset of the pool's) for one video."""
+        global last_ring_metrics
+        from allModelspreprocess import N_JOINTS, keypoint_table, sample_frames
+        from keypoint_buffer import KeypointBuffer
+
+        with self._lock:
+            frames = sample_frames(video_path, target_fps, downscale)
+            first = next(frames, None)
+            if first is None:
+                return {name: keypoint_table(name, KeypointBuffer(N_JOINTS), 0, 0, downscale or 1.0)
+                        for name in methods}
+            width, height = first[2]
+
+            ring = FrameRing(ring_slots({name: batch_sizes.get(name, 1) for name in methods}),
+                             first[1].shape, len(methods), self._ctx, cond=self._cond)
+            task_id = uuid.uuid4().hex
+            for consumer, name in enumerate(methods):
+                self._tasks[name].put((task_id, ring.spec(), consumer, batch_sizes.get(name, 1)))
+
+            buffers = {}
+            errors = {}
+            try:
+                for frame_index, frame, _, _ in itertools.chain([first], frames):
+                    # the ring blocks while every slot is still held by some backend
+                    while not ring.put(frame, frame_index, timeout=1.0):
+                        self._collect(task_id, buffers, errors, timeout=0)
+                        if errors:
+                            raise RuntimeError(f"Parallel extraction failed: {errors}")
+                ring.close()
+
+                while len(buffers) + len(errors) < len(methods):
+                    self._collect(task_id, buffers, errors, timeout=1.0)
+                if errors:
+                    raise RuntimeError(f"Parallel extraction failed: {errors}")
+            finally:
+                frames.close()
+                ring.close()
+                last_ring_metrics = dict(ring.metrics(), consumers=list(methods))
+                ring.close_shm()
+
+        print(f"Frame ring: {last_ring_metrics}")
+        return {
+            name: keypoint_table(name, buffers[name], width, height, downscale or 1.0)
+            for name in methods
+        }
+
+    def close(self):
+        for name, worker in self._workers.items():
+            if worker.is_alive():
+                self._tasks[name].put(None)
+        for worker in self._workers.values():
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+
+
+# Started on first use and kept for the following videos.
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_extraction_pool(cores=None):
+    """The process' ExtractionPool for every backend, replaced if a worker died or `cores` changed."""
+    global _pool
+    from allModelspreprocess import BACKENDS
+
+    with _pool_lock:
+        if _pool is not None and (not _pool.alive() or (cores is not None and sorted(cores) != _pool.cores)):
+            _pool.close()
+            _pool = None
+        if _pool is None:
+            _pool = ExtractionPool(list(BACKENDS), cores)
+        return _pool
+
+
+def extract_parallel(video_path, methods, batch_sizes=None, target_fps=None, downscale=None, cores=None):
+    """Same result as allModelspreprocess.extract_keypoint_frames, one pinned process per backend."""
+    from allModelspreprocess import YOLO_BATCH_SIZE
+
+    if batch_sizes is None:
+        batch_sizes = {"yolo": YOLO_BATCH_SIZE}
+    return get_extraction_pool(cores).extract(video_path, methods, batch_sizes, target_fps, downscale)
@@ -0,0 +1,214 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import metrics
+
+
+# Stages spend nearly all their time in OpenCV, TFLite, torch, TensorFlow and
+# pandas, which release the GIL, so a shared thread pool is enough to run
+# independent stages side by side without new interpreters.
+STAGE_WORKERS = 4
+
+# Answer repeated uploads from result_cache.py instead of re-running the models.
+USE_RESULT_CACHE = True
+
+_stage_pool = None
+_stage_pool_lock = threading.Lock()
+
+
+def get_stage_pool():
+    global _stage_pool
+    with _stage_pool_lock:
+        if _stage_pool is None:
+            _stage_pool = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="stage")
+        return _stage_pool
+
+
+class Stage:
+    """One node of the pipeline.
+
+    fn is called with a single dict holding the pipeline inputs plus the
+    result of every finished stage, keyed by stage name.
+    """
+
+    def __init__(self, name, fn, deps=()):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+
+
+class PipelineError(RuntimeError):
+    def __init__(self, stage, error, timings):
+        super().__init__(f"Stage '{stage}' failed: {error!r}")
+        self.stage = stage
+        self.error = error
+        self.timings = timings
+
+
+class Pipeline:
+    """Runs stages as soon as all their dependencies have finished."""
+
+    def __init__(self, stages):
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage: {stage.name}")
+            self.stages[stage.name] = stage
+
+        # Dependencies must be declared before use, which also rules out cycles.
+        seen = set()
+        for stage in stages:
+            missing = [dep for dep in stage.deps if dep not in seen]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown or later stages: {missing}")
+            seen.add(stage.name)
+
+    def run(self, pool=None, **inputs):
+        """Returns (results, timings); timings are seconds per stage."""
+        pool = pool or get_stage_pool()
+        context = dict(inputs)
+        timings = {}
+        started = time.perf_counter()
+        pending = dict(self.stages)
+        running = {}
+
+        def call(stage):
+            t0 = time.perf_counter()
+            try:
+                return stage.fn(context)
+            finally:
+                seconds = time.perf_counter() - t0
+                timings[stage.name] = {"start": round(t0 - started, 3), "seconds": round(seconds, 3)}
+                metrics.stage_seconds.observe(seconds, stage=stage.name)
+
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(dep in context for dep in stage.deps):
+                    del pending[name]
+                    running[pool.submit(call, stage)] = name
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                if future.exception() is not None:
+                    for other in running:
+                        other.cancel()
+                    raise PipelineError(name, future.exception(), timings)
+                context[name] = future.result()
+
+        timings["total"] = {"start": 0.0, "seconds": round(time.perf_counter() - started, 3)}
+        return {name: context[name] for name in self.stages}, timings
+
+
+def build_video_pipeline(export_csv=False, cached_keypoints=None, cache_results=False, extracted=None):
+    """Extraction -> standardisation -> (keypoint store, ensemble prediction).
+
+    Inputs: video_path and workdir, plus content_hash and settings when
+    cache_results is set. The sampling settings (and the stride they give
+    for this video) are stored with the keypoints. With export_csv the extractor and
+    test_*_dataset.csv tables are also written into workdir, as the
+    separate scripts used to do. With `cached_keypoints` (standardised
+    tables from the result cache) extraction is skipped altogether; with
+    `extracted` (extractor tables computed elsewhere, e.g. while the video
+    was still uploading) the extraction stage just hands them on.
+    """
+    # Imported here so importing the scheduler does not load any model code.
+    from allModelspreprocess import (BACKENDS, OUTPUT_CSV, OUTPUT_ENCODING, TARGET_FPS, DOWNSCALE,
+                                     extract_keypoint_frames)
+    from additionalPreprocess import standardize_backends, export_csv as export_test_csv
+    from ensambleModelRun import ensemble_signature, predict_from_frames
+    from keypoint_store import save_keypoints
+    from result_cache import get_result_cache
+    from video_decoder import video_sample_stride
+
+    def sampling(ctx):
+        return {"target_fps": TARGET_FPS, "downscale": DOWNSCALE,
+                "stride": video_sample_stride(ctx["video_path"], TARGET_FPS)}
+
+    def write_extractor_csv(ctx):
+        for name, df in ctx["extraction"].items():
+            df.to_csv(os.path.join(ctx["workdir"], OUTPUT_CSV[name]), index=False, encoding=OUTPUT_ENCODING[name])
+
+    def store(ctx):
+        for name, df in ctx["standardisation"].items():
+            save_keypoints(ctx["workdir"], name, df, extraction=ctx["sampling"])
+
+    def cache(ctx):
+        result_cache = get_result_cache()
+        if cached_keypoints is None:
+            result_cache.put_keypoints(ctx["content_hash"], ctx["standardisation"], ctx["settings"])
+        result_cache.put_predictions(ctx["content_hash"], ensemble_signature(), ctx["ensemble"], ctx["settings"])
+
+    if cached_keypoints is None:
+        stages = [
+            Stage("extraction", lambda ctx: extracted if extracted is not None
+                  else extract_keypoint_frames(ctx["video_path"], list(BACKENDS))),
+            Stage("standardisation", lambda ctx: standardize_backends(ctx["extraction"]), deps=["extraction"])
+        ]
+        if export_csv:
+            stages.append(Stage("extractor_csv", write_extractor_csv, deps=["extraction"]))
+    else:
+        stages = [Stage("standardisation", lambda ctx: cached_keypoints)]
+
+    stages += [
+        Stage("sampling", sampling),
+        Stage("keypoint_store", store, deps=["standardisation", "sampling"]),
+        Stage("ensemble", lambda ctx: predict_from_frames(ctx["standardisation"], ctx["workdir"],
+                                                          ctx["sampling"]["stride"]),
+              deps=["standardisation", "sampling"])
+    ]
+    if export_csv:
+        stages.append(Stage("test_csv", lambda ctx: export_test_csv(ctx["standardisation"], ctx["workdir"]),
+                            deps=["standardisation"]))
+    if cache_results:
+        stages.append(Stage("result_cache", cache, deps=["standardisation", "ensemble"]))
+    return Pipeline(stages)
+
+
+def run_video_pipeline(video_path, workdir, export_csv=False, use_cache=USE_RESULT_CACHE, extracted=None,
+                       content_hash=None):
+    """Returns (ensemble predictions DataFrame, per-stage timings).
+
+    With use_cache a video seen before with the same models is answered
+    from the result cache; if only the GRUs changed, just the ensemble runs.
+    The cache key is `content_hash`, or the hash a workspace is named after;
+    the video is only hashed again when neither is known. The peak memory
+    of the process meanwhile goes to metrics.job_peak_memory.
+    """
+    with metrics.track_peak_memory():
+        return _run_video_pipeline(video_path, workdir, export_csv, use_cache, extracted, content_hash)
+
+def _run_video_pipeline(video_path, workdir, export_csv, use_cache, extracted, content_hash):
+    if not use_cache:
+        results, timings = build_video_pipeline(export_csv, extracted=extracted).run(
+            video_path=video_path, workdir=workdir)
+        return results["ensemble"], timings
+
+    import pandas as pd
+    from allModelspreprocess import TARGET_FPS, DOWNSCALE
+    from additionalPreprocess import export_csv as export_test_csv
+    from ensambleModelRun import ensemble_signature
+    from result_cache import get_result_cache
+    from workspace import video_hash, workspace_hash
+
+    start = time.perf_counter()
+    cache = get_result_cache()
+    content_hash = content_hash or workspace_hash(workdir) or video_hash(video_path)
+    settings = {"target_fps": TARGET_FPS, "downscale": DOWNSCALE}
+
+    records = cache.get_predictions(content_hash, ensemble_signature(), settings)
+    cached_keypoints = cache.get_keypoints(content_hash, settings) if records is None or export_csv else None
+    if records is not None and (cached_keypoints is not None or not export_csv):
+        df_output = pd.DataFrame(records)
+        df_output.to_csv(os.path.join(workdir, 'ensemble_predictions_with_ids.csv'), index=False)
+        if export_csv:
+            export_test_csv(cached_keypoints, workdir)
+        seconds = round(time.perf_counter() - start, 3)
+        return df_output, {"result_cache": {"start": 0.0, "seconds": seconds},
+                           "total": {"start": 0.0, "seconds": seconds}}
+
+    pipeline = build_video_pipeline(export_csv, cached_keypoints, cache_results=True, extracted=extracted)
+    results, timings = pipeline.run(video_path=video_path, workdir=workdir,
+                                    content_hash=content_hash, settings=settings)
+    return results["ensemble"], timings
@@ -1,15 +1,11 @@
-
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
-import threading
-import time
 import cv2
 import numpy as np
 import pandas as pd
-import tensorflow as tf
-from ultralytics import YOLO
-import mediapipe as mp
+# The same warm models, loaders and warm-up as the main extraction server
+from allModelspreprocess import extract_keypoints, registry
 
 app = Flask(__name__)
 CORS(app)
@@ -18,8 +14,10 @@ UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 def process_movenet(video_path):
-    interpreter = tf.lite.Interpreter(model_path="models/thunder3.tflite")
-    interpreter.allocate_tensors()
+    with registry.acquire("movenet") as interpreter:
+        _process_movenet(interpreter, video_path)
+
+def _process_movenet(interpreter, video_path):
 
     selected_keypoints = [5, 6, 7, 8, 11, 12, 13, 14]
     MIN_X, MAX_X = -1, 1
@@ -73,7 +71,10 @@ def process_movenet(video_path):
     print("✔ MoveNet: done.")
 
 def process_yolo(video_path):
-    model = YOLO('models/yolo11n-pose.pt')
+    with registry.acquire("yolo") as model:
+        _process_yolo(model, video_path)
+
+def _process_yolo(model, video_path):
     WINDOW_SIZE = 60
     dataset = []
 
@@ -98,7 +99,7 @@ def process_yolo(video_path):
             break
 
         height, width, _ = frame.shape
-        results = model(frame)
+        results = model(frame, verbose=False)
 
         if len(results[0].keypoints) == 0:
             frame_index += 1
@@ -131,7 +132,10 @@ def process_yolo(video_path):
     print("✔ YOLO: done.")
 
 def process_mediapipe(video_path):
-    pose = mp.solutions.pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+    with registry.acquire("mediapipe") as pose:
+        _process_mediapipe(pose, video_path)
+
+def _process_mediapipe(pose, video_path):
 
     selected_keypoints = [11, 12, 13, 14, 23, 24, 25, 26]
     MIN_X, MAX_X = -1, 1
@@ -197,6 +201,14 @@ def upload_and_process():
     video_path = os.path.join(UPLOAD_FOLDER, video.filename)
     video.save(video_path)
 
+    if request.args.get('parallel', 0, type=int):
+        # one pinned process per backend, sharing the decoded frames
+        csv_paths = extract_keypoints(video_path, ["movenet", "yolo", "mediapipe"], parallel=True)
+        return jsonify({
+            'message': 'Video processed by all models in parallel',
+            'csv_outputs': list(csv_paths.values())
+        }), 200
+
     process_movenet(video_path)
     process_yolo(video_path)
     process_mediapipe(video_path)
@@ -210,5 +222,10 @@ def upload_and_process():
         ]
     }), 200
 
+@app.route('/models', methods=['GET'])
+def model_status():
+    return jsonify(registry.report()), 200
+
 if __name__ == '__main__':
+    registry.preload()
     app.run(host='0.0.0.0', port=5050)
@@ -0,0 +1,105 @@
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from ensambleModelRun import (
+    VOTE_TYPE, backends, weights_motion, align_store, aligned_sequences,
+    ensemble_predictions, predict_all_models, voted_frame
+)
+from keypoint_store import has_keypoints
+from workspace import JOBS_FOLDER
+
+
+SEQUENCE_BATCH = 1024
+
+
+# Re-score every processed video with the current GRU models, straight from
+# the keypoints each workspace stores (keypoints/<backend>/), without running
+# any pose model again. Run it after replacing the .keras files in models/.
+# Sequences of many videos go through the ensemble together so the GRUs see
+# full batches; they stay strided views until a batch of SEQUENCE_BATCH is
+# copied out for the model, so a small hop does not multiply the memory.
+# Usage: python rescore_archive.py [jobs folder] [--videos-per-batch N] [--summary FILE]
+
+
+def find_workspaces(root):
+    """Workspaces under `root` whose keypoints are stored for all three backends."""
+    workspaces = []
+    for name in sorted(os.listdir(root)):
+        workdir = os.path.join(root, name)
+        if os.path.isdir(workdir) and all(has_keypoints(workdir, backend) for backend in backends):
+            workspaces.append(workdir)
+    return workspaces
+
+def sequence_batches(views, batch_size=SEQUENCE_BATCH):
+    """Dense {backend: sequences} batches taken in order from per-video sequence views."""
+    pieces, size = [], 0
+    for video in views:
+        n, start = len(video[backends[0]]), 0
+        while start < n:
+            take = min(batch_size - size, n - start)
+            pieces.append({name: video[name][start:start + take] for name in backends})
+            size += take
+            start += take
+            if size == batch_size:
+                yield {name: np.concatenate([piece[name] for piece in pieces]) for name in backends}
+                pieces, size = [], 0
+    if pieces:
+        yield {name: np.concatenate([piece[name] for piece in pieces]) for name in backends}
+
+def predict_views(views):
+    """predict_all_models over the sequence views of many videos, one batch at a time."""
+    chunks = [predict_all_models(batch) for batch in sequence_batches(views)]
+    return {
+        name: {output: np.concatenate([chunk[name][output] for chunk in chunks]) for output in chunks[0][name]}
+        for name in backends
+    }
+
+def rescore_batch(workdirs):
+    """Score a group of workspaces with one ensemble call; returns summary rows."""
+    videos = []
+    for workdir in workdirs:
+        X_tests, df_common = align_store(workdir)
+        sequences = aligned_sequences(X_tests)
+        n = len(sequences[backends[0]])
+        videos.append((workdir, df_common, sequences, n))
+
+    scored = [v for v in videos if v[3] > 0]
+    rows = [{"workspace": workdir, "windows": 0} for workdir, _, _, n in videos if n == 0]
+    if not scored:
+        return rows
+
+    # one vote for the whole group of videos, then split per video
+    predictions = predict_views([sequences for _, _, sequences, _ in scored])
+    voted = ensemble_predictions(predictions, weights=weights_motion, vote_type=VOTE_TYPE)
+
+    offset = 0
+    for workdir, df_common, _, n in scored:
+        df_output = voted_frame([values[offset:offset + n] for values in voted], df_common)
+        offset += n
+        df_output.to_csv(os.path.join(workdir, 'ensemble_predictions_with_ids.csv'), index=False)
+        rows.append({"workspace": workdir, "windows": len(df_output)})
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Re-score stored keypoints with the current GRU models")
+    parser.add_argument("root", nargs="?", default=JOBS_FOLDER)
+    parser.add_argument("--videos-per-batch", type=int, default=64)
+    parser.add_argument("--summary", default="rescore_summary.csv")
+    args = parser.parse_args()
+
+    workspaces = find_workspaces(args.root)
+    print(f"Re-scoring {len(workspaces)} videos from {args.root}")
+
+    start = time.perf_counter()
+    rows = []
+    for i in range(0, len(workspaces), args.videos_per_batch):
+        rows.extend(rescore_batch(workspaces[i:i + args.videos_per_batch]))
+        print(f"{min(i + args.videos_per_batch, len(workspaces))}/{len(workspaces)} videos, "
+              f"{time.perf_counter() - start:.1f}s")
+
+    summary = pd.DataFrame(rows)
+    summary.to_csv(args.summary, index=False)
+    print(f"Done in {time.perf_counter() - start:.1f}s; summary written to {args.summary}")
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from importlib import metadata
+import metrics
+from keypoint_store import STORE_VERSION, has_keypoints, load_keypoint_frame, save_keypoints
+from model_config import MOVENET_MODEL, YOLO_MODEL, MEDIAPIPE_OPTIONS
+from workspace import video_hash
+
+
+# Persistent cache of pipeline results, keyed by the SHA-256 of the uploaded
+# video plus a fingerprint of everything that produced the result:
+#   keypoints/<key>/    standardised keypoints of the three backends (keypoint
+#                       store format); key = video + pose models + sampling
+#   predictions/<key>.json
+#                       ensemble records; key = keypoint key + GRU models and
+#                       ensemble settings
+# Replacing a model file changes its fingerprint, so stale entries are simply
+# never hit again and age out. The least recently used entries are evicted
+# once the cache is larger than CACHE_MAX_BYTES.
+
+CACHE_FOLDER = "cache"
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+CACHE_BACKENDS = ['yolo', 'movenet', 'mediapipe']
+
+# File fingerprints, reused while the file's size and mtime are unchanged.
+_file_fingerprints = {}
+_file_fingerprints_lock = threading.Lock()
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_fingerprints_lock:
+        fingerprint = _file_fingerprints.get(key)
+    if fingerprint is None:
+        fingerprint = video_hash(path)
+        with _file_fingerprints_lock:
+            _file_fingerprints[key] = fingerprint
+    return fingerprint
+
+def _package_version(name):
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+def _digest(parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+def keypoint_key(content_hash, settings=None):
+    """Cache key for the standardised keypoints of a video.
+
+    `settings` holds the extraction options that change the keypoints
+    (target_fps, downscale); None values are the full-rate defaults.
+    """
+    return _digest({
+        "video": content_hash,
+        "store_version": STORE_VERSION,
+        "movenet": file_fingerprint(MOVENET_MODEL),
+        "yolo": file_fingerprint(YOLO_MODEL),
+        "mediapipe": dict(MEDIAPIPE_OPTIONS, version=_package_version("mediapipe")),
+        "settings": {k: v for k, v in (settings or {}).items() if v is not None}
+    })
+
+def prediction_key(content_hash, ensemble, settings=None):
+    """Cache key for the ensemble records of a video.
+
+    `ensemble` is ensambleModelRun.ensemble_signature(): the model files
+    being served and the settings that shape the predictions.
+    """
+    return _digest({
+        "keypoints": keypoint_key(content_hash, settings),
+        "models": {path: file_fingerprint(path) for path in ensemble["files"]},
+        "config": ensemble["config"]
+    })
+
+
+class ResultCache:
+    def __init__(self, root=CACHE_FOLDER, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.stats = {kind: {"hits": 0, "misses": 0} for kind in ("keypoints", "predictions")}
+        os.makedirs(os.path.join(root, "keypoints"), exist_ok=True)
+        os.makedirs(os.path.join(root, "predictions"), exist_ok=True)
+
+    def _count(self, kind, hit):
+        metrics.cache_lookups.inc(kind=kind, result="hit" if hit else "miss")
+        with self._lock:
+            self.stats[kind]["hits" if hit else "misses"] += 1
+
+    def _touch(self, path):
+        # entries are evicted by mtime, so a hit moves them to the back
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    # ---------- keypoints ----------
+    def get_keypoints(self, content_hash, settings=None):
+        """Standardised tables {backend: DataFrame}, or None on a miss."""
+        entry = os.path.join(self.root, "keypoints", keypoint_key(content_hash, settings))
+        if not all(has_keypoints(entry, name) for name in CACHE_BACKENDS):
+            self._count("keypoints", False)
+            return None
+        self._touch(entry)
+        self._count("keypoints", True)
+        return {name: load_keypoint_frame(entry, name) for name in CACHE_BACKENDS}
+
+    def put_keypoints(self, content_hash, standardized, settings=None):
+        entry = os.path.join(self.root, "keypoints", keypoint_key(content_hash, settings))
+        if os.path.isdir(entry):
+            return entry
+
+        # Build the entry next to its final place and rename it in, so a
+        # concurrent reader never sees a partial one.
+        tmp_entry = f"{entry}.tmp-{uuid.uuid4().hex}"
+        for name in CACHE_BACKENDS:
+            save_keypoints(tmp_entry, name, standardized[name])
+        try:
+            os.replace(tmp_entry, entry)
+        except OSError:
+            # another worker stored the same entry first
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+        self.evict()
+        return entry
+
+    # ---------- predictions ----------
+    def _prediction_path(self, content_hash, ensemble, settings):
+        return os.path.join(self.root, "predictions", prediction_key(content_hash, ensemble, settings) + ".json")
+
+    def get_predictions(self, content_hash, ensemble, settings=None):
+        """The ensemble records of the video, or None on a miss."""
+        path = self._prediction_path(content_hash, ensemble, settings)
+        try:
+            with open(path) as f:
+                records = json.load(f)
+        except FileNotFoundError:
+            self._count("predictions", False)
+            return None
+        self._touch(path)
+        self._count("predictions", True)
+        return records
+
+    def put_predictions(self, content_hash, ensemble, df_output, settings=None):
+        path = self._prediction_path(content_hash, ensemble, settings)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        with open(tmp_path, "w") as f:
+            f.write(df_output.to_json(orient='records'))
+        os.replace(tmp_path, path)
+        self.evict()
+        return path
+
+    # ---------- eviction ----------
+    def _entries(self):
+        entries = []
+        for kind in ("keypoints", "predictions"):
+            folder = os.path.join(self.root, kind)
+            for name in os.listdir(folder):
+                if ".tmp-" in name:
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    if os.path.isdir(path):
+                        size = sum(os.path.getsize(os.path.join(dirpath, f))
+                                   for dirpath, _, files in os.walk(path) for f in files)
+                    else:
+                        size = os.path.getsize(path)
+                    entries.append((os.path.getmtime(path), size, path))
+                except FileNotFoundError:
+                    # evicted by another process meanwhile
+                    continue
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+
+    def report(self):
+        with self._lock:
+            stats = {kind: dict(s) for kind, s in self.stats.items()}
+        for s in stats.values():
+            lookups = s["hits"] + s["misses"]
+            s["hit_rate"] = round(s["hits"] / lookups, 3) if lookups else None
+        return {"root": self.root, "max_bytes": self.max_bytes, "bytes": self.size(), **stats}
+
+
+# Created on first use, like the job queue.
+result_cache = None
+_result_cache_lock = threading.Lock()
+
+def get_result_cache():
+    global result_cache
+    with _result_cache_lock:
+        if result_cache is None:
+            result_cache = ResultCache()
+        return result_cache
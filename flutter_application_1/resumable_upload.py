@@ -0,0 +1,484 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+import uuid
+import cv2
+from video_decoder import sample_stride
+
+# Chunked, resumable uploads. A client creates a session with the file name
+# and size, then PUTs consecutive chunks at the offset the server reports;
+# after a dropped connection it asks for the offset again and carries on from
+# there. The SHA-256 of the whole file is checked when the client completes
+# the upload, and can be checked per chunk as well.
+#
+# Sessions live on disk (uploads/sessions/<id>/: meta.json, state.json, the
+# partial data and, once processed, result.json), so an upload survives a
+# server restart: the offset is simply the size of the partial file.
+
+SESSIONS_FOLDER = os.path.join("uploads", "sessions")
+
+# Bytes read from the request stream at a time while writing a chunk.
+WRITE_BUFFER = 1 << 20
+
+# Extraction of a progressive upload never reads closer than this to the
+# end of the received data, so it does not decode a frame that is still
+# only partly uploaded.
+PROGRESSIVE_MARGIN_BYTES = 8 << 20
+
+# An upload that receives no chunk for this long is expired: its progressive
+# extraction stops and its directory is deleted.
+UPLOAD_IDLE_TIMEOUT = 30 * 60
+# Finished (done/failed) sessions keep their status for clients to poll
+# this long after their last change.
+SESSION_RETENTION = 24 * 60 * 60
+EXPIRY_CHECK_SECONDS = 60
+
+_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def container_header_end(path, extension):
+    """Where the container header ends if the file can be decoded while it grows.
+
+    MP4/MOV files qualify when the 'moov' index comes before the media data
+    ("fast start"); Matroska/WebM always do. Returns None when the file cannot
+    be read progressively and -1 when more data is needed to tell.
+    """
+    if extension in (".mkv", ".webm"):
+        return 0
+    if extension not in (".mp4", ".mov", ".m4v"):
+        return None
+
+    size = os.path.getsize(path)
+    offset = 0
+    with open(path, "rb") as f:
+        while offset + 8 <= size:
+            f.seek(offset)
+            box_size, box_type = struct.unpack(">I4s", f.read(8))
+            if box_size == 1:
+                if offset + 16 > size:
+                    return -1
+                box_size = struct.unpack(">Q", f.read(8))[0]
+            if box_type == b"moov":
+                end = offset + box_size
+                return end if end <= size else -1
+            if box_type == b"mdat" or box_size == 0:
+                return None
+            offset += box_size
+    return -1
+
+
+def _write_json(path, data):
+    # write next to the target and rename, so a restart never reads half a file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class UploadSession:
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.meta = meta
+        self.data_path = os.path.join(directory, "data" + meta["extension"])
+        self.state_path = os.path.join(directory, "state.json")
+        self.result_path = os.path.join(directory, "result.json")
+        self.state = "uploading"
+        self.content_hash = None
+        self.result = None
+        self.error = None
+        self.header_end = -1
+        self.worker = None
+        self.last_activity = time.time()
+        self._writing = False
+        self._cond = threading.Condition()
+        self._committed = 0
+        # SHA-256 of the verified bytes so far, so completing needs no re-read
+        self._digest = hashlib.sha256()
+
+    @classmethod
+    def load(cls, directory):
+        """Rebuild a session from disk, e.g. after a restart; None if unknown."""
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        session = cls(directory, meta)
+        try:
+            with open(session.state_path) as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            saved = {"state": "uploading" if os.path.exists(session.data_path) else "failed",
+                     "error": None if os.path.exists(session.data_path) else "Upload data is missing"}
+        session.state = saved["state"]
+        session.content_hash = saved.get("content_hash")
+        session.error = saved.get("error")
+        session.last_activity = saved.get("updated_at", session.last_activity)
+        if session.state == "done":
+            try:
+                with open(session.result_path) as f:
+                    session.result = json.load(f)
+            except FileNotFoundError:
+                pass
+        if session.state == "uploading" and not os.path.exists(session.data_path):
+            session.state, session.error = "failed", "Upload data is missing"
+        if session.state == "uploading":
+            # the hash is rebuilt once from the partial file
+            with open(session.data_path, "rb") as f:
+                for block in iter(lambda: f.read(WRITE_BUFFER), b""):
+                    session._digest.update(block)
+                    session._committed += len(block)
+            session.header_end = container_header_end(session.data_path, meta["extension"])
+            session.last_activity = max(session.last_activity, os.path.getmtime(session.data_path))
+        else:
+            session._committed = session.size
+        return session
+
+    def _save_state(self):
+        _write_json(self.state_path, {
+            "state": self.state,
+            "content_hash": self.content_hash,
+            "error": self.error,
+            "updated_at": self.last_activity
+        })
+
+    def set_state(self, state, result=None, error=None):
+        """Move to `state` and persist it; `result` is kept in result.json."""
+        with self._cond:
+            if self.state == "expired":
+                return False
+            if result is not None:
+                _write_json(self.result_path, result)
+                self.result = result
+            self.state = state
+            self.error = error
+            self.last_activity = time.time()
+            self._save_state()
+            self._cond.notify_all()
+            return True
+
+    @property
+    def upload_id(self):
+        return self.meta["upload_id"]
+
+    @property
+    def size(self):
+        return self.meta["size"]
+
+    @property
+    def offset(self):
+        """Bytes received and verified; a chunk still being written is not counted."""
+        return self._committed
+
+    @property
+    def complete(self):
+        return self.state != "uploading"
+
+    @property
+    def progressive(self):
+        return self.header_end is not None and self.header_end >= 0
+
+    def idle_seconds(self):
+        return time.time() - self.last_activity
+
+    def start_worker(self, target):
+        """Start `target(session)` on a thread, once per session."""
+        with self._cond:
+            if self.worker is not None:
+                return False
+            self.worker = threading.Thread(target=target, args=(self,), daemon=True,
+                                           name=f"upload-{self.upload_id[:8]}")
+        self.worker.start()
+        return True
+
+    def write_chunk(self, offset, stream, chunk_sha256=None):
+        """Append a chunk read from `stream` at `offset`; returns the new offset.
+
+        The session lock is only held to claim the write and to commit it,
+        not while the chunk is read from the network.
+        """
+        with self._cond:
+            if self.state != "uploading":
+                raise UploadError("Upload already completed", 409, offset=self.offset)
+            if self._writing:
+                raise UploadError("Another chunk is being written", 409, offset=self.offset)
+            if offset != self.offset:
+                raise UploadError("Offset does not match the received data", 409, offset=self.offset)
+            self._writing = True
+            self.last_activity = time.time()
+
+        try:
+            digest = self._digest.copy()
+            chunk_digest = hashlib.sha256()
+            written = 0
+            with open(self.data_path, "r+b") as f:
+                f.seek(offset)
+                while True:
+                    block = stream.read(WRITE_BUFFER)
+                    if not block:
+                        break
+                    if offset + written + len(block) > self.size:
+                        f.truncate(offset)
+                        raise UploadError("Chunk runs past the declared size", 400, offset=offset)
+                    f.write(block)
+                    digest.update(block)
+                    chunk_digest.update(block)
+                    written += len(block)
+
+                if chunk_sha256 and chunk_digest.hexdigest() != chunk_sha256.lower():
+                    # drop the corrupted chunk so the client can resend it
+                    f.truncate(offset)
+                    raise UploadError("Chunk checksum mismatch", 400, offset=offset)
+        except BaseException:
+            with self._cond:
+                self._writing = False
+            raise
+
+        header_end = self.header_end
+        if header_end == -1:
+            header_end = container_header_end(self.data_path, self.meta["extension"])
+        with self._cond:
+            self._digest = digest
+            self._committed = offset + written
+            self.header_end = header_end
+            self.last_activity = time.time()
+            self._writing = False
+            self._cond.notify_all()
+            return self._committed
+
+    def finish(self, sha256):
+        """Check the whole file against the client's SHA-256."""
+        with self._cond:
+            if self.state in ("processing", "done") and self.content_hash == (sha256 or "").lower():
+                # completed before, e.g. a retried request
+                return self.content_hash
+            if self.state != "uploading":
+                raise UploadError(f"Upload is {self.state}", 409, offset=self.offset)
+            if self._writing or self.offset != self.size:
+                raise UploadError("Upload is incomplete", 409, offset=self.offset)
+            content_hash = self._digest.hexdigest()
+            self.last_activity = time.time()
+            if content_hash != (sha256 or "").lower():
+                self.state = "failed"
+                self.error = "File checksum mismatch"
+                self._save_state()
+                self._cond.notify_all()
+                raise UploadError(self.error, 422, offset=self.offset)
+            self.state = "processing"
+            self.content_hash = content_hash
+            self._save_state()
+            self._cond.notify_all()
+            return content_hash
+
+    def expire(self):
+        """Stop the session; a running frames() iterator ends with an UploadError."""
+        with self._cond:
+            self.state = "expired"
+            self.error = "Upload expired"
+            self._cond.notify_all()
+
+    def wait_for_data(self, timeout):
+        with self._cond:
+            self._cond.wait(timeout)
+
+    def status(self):
+        status = {
+            "upload_id": self.upload_id,
+            "filename": self.meta["filename"],
+            "size": self.size,
+            "offset": self.offset,
+            "state": self.state,
+            "progressive": self.progressive
+        }
+        if self.error is not None:
+            status["error"] = self.error
+        if self.result is not None:
+            status.update(self.result)
+        return status
+
+    # ---------- progressive decoding ----------
+    def _open_at(self, frame_index):
+        """Capture of the data so far, positioned at `frame_index`; None if it cannot be yet.
+
+        Seeking is not frame-accurate for every codec, so the position is
+        checked and, if it is off, the frames before it are read instead.
+        """
+        cap = cv2.VideoCapture(self.data_path)
+        if cap.isOpened() and frame_index:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+            if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != frame_index:
+                cap.release()
+                cap = cv2.VideoCapture(self.data_path)
+                for _ in range(frame_index):
+                    if not cap.grab():
+                        cap.release()
+                        break
+        if not cap.isOpened() or cap.get(cv2.CAP_PROP_FRAME_COUNT) <= 0:
+            cap.release()
+            return None
+        return cap
+
+    def frames(self, target_fps=None, downscale=None, margin=PROGRESSIVE_MARGIN_BYTES, poll=0.5):
+        """Yield decode_frames() items while the file grows.
+
+        Frames are sampled and resized as video_decoder.decode_frames does.
+        Assumes the media data is spread evenly over the file, so frame i is
+        decoded only once the received bytes are past its estimated position
+        plus `margin`. One capture reads the file front to back; it is only
+        reopened at the next frame if it reaches the end of the data received
+        so far. Raises UploadError once the session expires or fails.
+        """
+        cap = None
+        frame_index = 0
+        next_sample = 0.0
+        try:
+            while True:
+                complete = self.complete
+                if self.state in ("expired", "failed"):
+                    raise UploadError(f"Upload {self.state}", 410)
+                if cap is None:
+                    cap = self._open_at(frame_index)
+                    if cap is not None:
+                        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                        stride = sample_stride(cap.get(cv2.CAP_PROP_FPS) or 30.0, target_fps)
+
+                at_end = cap is None
+                while not at_end:
+                    if not complete:
+                        media_bytes = self.size - self.header_end
+                        needed = self.header_end + media_bytes * (frame_index + 1) / total_frames + margin
+                        if self.offset < needed:
+                            break
+                    if frame_index < next_sample - 1e-6:
+                        at_end = not cap.grab()
+                        if not at_end:
+                            frame_index += 1
+                        continue
+
+                    ret, frame = cap.read()
+                    if not ret:
+                        at_end = True
+                        break
+                    next_sample += stride
+                    timestamp_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+                    height, width, _ = frame.shape
+                    if downscale and downscale != 1.0:
+                        frame = cv2.resize(frame, None, fx=downscale, fy=downscale, interpolation=cv2.INTER_AREA)
+                    yield frame_index, frame, (width, height), timestamp_ms
+                    frame_index += 1
+
+                if complete and at_end:
+                    return
+                if at_end and cap is not None:
+                    # read everything received so far; reopen once more has arrived
+                    cap.release()
+                    cap = None
+                self.wait_for_data(poll)
+        finally:
+            if cap is not None:
+                cap.release()
+
+
+class UploadStore:
+    """Upload sessions by id, kept on disk under `root`.
+
+    A janitor thread expires uploads that received nothing for `idle_timeout`
+    seconds, which also stops their progressive extraction, and deletes
+    finished sessions `retention` seconds after their last change.
+    """
+
+    def __init__(self, root=SESSIONS_FOLDER, idle_timeout=UPLOAD_IDLE_TIMEOUT,
+                 retention=SESSION_RETENTION, processor=None):
+        self.root = root
+        self.idle_timeout = idle_timeout
+        self.retention = retention
+        # called as processor(session) for sessions that were still
+        # processing when the server stopped
+        self.processor = processor
+        self._sessions = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._janitor = threading.Thread(target=self._expire_loop, name="upload-janitor", daemon=True)
+        self._janitor.start()
+
+    def create(self, filename, size):
+        if isinstance(size, bool) or not isinstance(size, int) or size <= 0:
+            raise UploadError("size must be a positive number of bytes")
+
+        upload_id = uuid.uuid4().hex
+        directory = os.path.join(self.root, upload_id)
+        os.makedirs(directory)
+        meta = {
+            "upload_id": upload_id,
+            "filename": os.path.basename(filename),
+            "extension": os.path.splitext(filename)[1].lower(),
+            "size": size,
+            "created_at": time.time()
+        }
+        _write_json(os.path.join(directory, "meta.json"), meta)
+
+        session = UploadSession(directory, meta)
+        open(session.data_path, "wb").close()
+        session._save_state()
+        with self._lock:
+            self._sessions[upload_id] = session
+        return session
+
+    def get(self, upload_id):
+        if not _ID_RE.fullmatch(upload_id):
+            return None
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is None:
+                # left over from before a restart
+                session = UploadSession.load(os.path.join(self.root, upload_id))
+                if session is None:
+                    return None
+                self._sessions[upload_id] = session
+        if session.state == "processing" and self.processor is not None:
+            session.start_worker(self.processor)
+        return session
+
+    def discard(self, session):
+        session.expire()
+        with self._lock:
+            self._sessions.pop(session.upload_id, None)
+        shutil.rmtree(session.directory, ignore_errors=True)
+
+    def expire_idle(self):
+        """Expire idle uploads and delete old finished sessions; returns how many."""
+        expired = 0
+        for upload_id in os.listdir(self.root):
+            session = self.get(upload_id)
+            if session is None:
+                continue
+            if session.state == "uploading":
+                if session._writing or session.idle_seconds() < self.idle_timeout:
+                    continue
+            elif session.state == "processing" or session.idle_seconds() < self.retention:
+                continue
+            print(f"Discarding {session.state} upload {upload_id} "
+                  f"(idle for {session.idle_seconds():.0f}s)")
+            self.discard(session)
+            expired += 1
+        return expired
+
+    def _expire_loop(self):
+        while True:
+            time.sleep(EXPIRY_CHECK_SECONDS)
+            try:
+                self.expire_idle()
+            except Exception as e:
+                print(f"Upload expiry failed: {e!r}")
@@ -0,0 +1,70 @@
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from allModelspreprocess import BACKENDS, extract_keypoint_frames
+from additionalPreprocess import standardize_backends
+from ensambleModelRun import predict_from_frames
+from video_decoder import video_sample_stride
+
+
+# Accuracy-vs-speed report for the extraction sampling modes. Every setting is
+# scored against the full-rate, full-resolution run of the same video, per
+# window_id, on the final ensemble output.
+# Usage: python sampling_report.py <video> [<video> ...]
+
+SETTINGS = [
+    {"target_fps": None, "downscale": None},
+    {"target_fps": 15, "downscale": None},
+    {"target_fps": 10, "downscale": None},
+    {"target_fps": None, "downscale": 0.5},
+    {"target_fps": 15, "downscale": 0.5},
+    {"target_fps": 10, "downscale": 0.5}
+]
+
+
+def run_setting(video_path, workdir, target_fps, downscale):
+    start = time.perf_counter()
+    frames = extract_keypoint_frames(video_path, list(BACKENDS), target_fps=target_fps, downscale=downscale)
+    extraction_time = time.perf_counter() - start
+
+    df_output = predict_from_frames(standardize_backends(frames), workdir,
+                                    video_sample_stride(video_path, target_fps))
+    return df_output, extraction_time
+
+def compare(baseline, df_output):
+    keys = ['video_id', 'window_id']
+    merged = baseline.merge(df_output, on=keys, suffixes=('_base', ''))
+    if merged.empty:
+        return {"windows": 0, "movement_rmse": np.nan, "knee_agreement": np.nan, "elbow_agreement": np.nan}
+
+    movement_diff = merged['movement_prediction'] - merged['movement_prediction_base']
+    return {
+        "windows": f"{len(merged)}/{len(baseline)}",
+        "movement_rmse": float(np.sqrt(np.mean(movement_diff ** 2))),
+        "knee_agreement": float((merged['knee_prediction'] == merged['knee_prediction_base']).mean()),
+        "elbow_agreement": float((merged['elbow_prediction'] == merged['elbow_prediction_base']).mean())
+    }
+
+
+if __name__ == '__main__':
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for video_path in sys.argv[1:]:
+            baseline = None
+            baseline_time = None
+            for setting in SETTINGS:
+                df_output, extraction_time = run_setting(video_path, workdir, **setting)
+                if baseline is None:
+                    baseline, baseline_time = df_output, extraction_time
+
+                row = {"video": video_path, **setting,
+                       "extraction_s": round(extraction_time, 2),
+                       "speedup": round(baseline_time / extraction_time, 2)}
+                row.update(compare(baseline, df_output))
+                rows.append(row)
+
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False))
+    report.to_csv("sampling_report.csv", index=False)
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from model_config import WINDOW_SIZE
+
+
+# GRU input sequences as strided views over the aligned feature rows. Every
+# sequence shares memory with the feature matrix, so overlapping sequences
+# (hop < timesteps) cost no extra memory; the engines only copy one batch at a
+# time when they hand it to the model.
+
+
+def source_rate(X_tests, df_common, stride=1.0, window_size=WINDOW_SIZE):
+    """One row per source frame for rows extracted every `stride` source frames.
+
+    The GRUs were trained on every frame, so TIMESTEPS and the hop count
+    source frames. For a sampled extraction (stride > 1, recorded with the
+    keypoints; see video_decoder.sample_stride) every source frame between
+    two neighbouring sampled rows is linearly interpolated. Only gaps the
+    sampling itself left are filled: where the rows are further apart, e.g.
+    because no pose was detected, the frames stay missing as they would at
+    the full rate. `X_tests` maps backend to feature rows aligned with
+    `df_common`; both are returned unchanged when stride <= 1.
+    """
+    if stride <= 1:
+        return X_tests, df_common
+    max_gap = int(np.ceil(stride))
+
+    frames = df_common['frame'].to_numpy(dtype=np.int64)
+    videos = df_common['video_id'].to_numpy()
+    same_video = videos[1:] == videos[:-1]
+    if len(frames) == 0:
+        return X_tests, df_common
+
+    # first row of every video; rows are ordered by video_id, then frame
+    firsts = np.flatnonzero(np.concatenate(([True], ~same_video)))
+    lasts = np.concatenate((firsts[1:], [len(frames)]))
+    lo_parts, hi_parts, weight_parts, video_parts, grid_parts = [], [], [], [], []
+    for first, last in zip(firsts, lasts):
+        sampled = frames[first:last]
+        grid = np.arange(sampled[0], sampled[-1] + 1)
+        lo = np.searchsorted(sampled, grid, side='right') - 1
+        hi = np.minimum(lo + 1, len(sampled) - 1)
+        span = sampled[hi] - sampled[lo]
+        keep = (grid == sampled[lo]) | (span <= max_gap)
+        grid, lo, hi, span = grid[keep], lo[keep], hi[keep], span[keep]
+        lo_parts.append(first + lo)
+        hi_parts.append(first + hi)
+        weight_parts.append(np.where(span > 0, (grid - sampled[lo]) / np.maximum(span, 1), 0.0))
+        video_parts.append(np.full(len(grid), videos[first]))
+        grid_parts.append(grid)
+
+    lo, hi = np.concatenate(lo_parts), np.concatenate(hi_parts)
+    weight = np.concatenate(weight_parts).astype(np.float32)[:, None]
+    X_full = {name: X[lo] * (1 - weight) + X[hi] * weight for name, X in X_tests.items()}
+    grid = np.concatenate(grid_parts)
+    df_full = pd.DataFrame({
+        'video_id': np.concatenate(video_parts),
+        'frame': grid,
+        'window_id': grid // window_size
+    })
+    return X_full, df_full
+
+def sequence_starts(n_rows, timesteps, hop):
+    """Row index of the first frame of every sequence."""
+    if n_rows < timesteps:
+        return np.zeros(0, dtype=np.int64)
+    return np.arange(0, n_rows - timesteps + 1, hop)
+
+def sequence_views(X, timesteps, hop):
+    """(sequences, timesteps, features) view of X's rows, starting every `hop` rows."""
+    X = np.asarray(X, dtype=np.float32)
+    if len(X) < timesteps:
+        return np.zeros((0, timesteps) + X.shape[1:], dtype=np.float32)
+    # sliding_window_view puts the window axis last: (rows, features, timesteps)
+    windows = sliding_window_view(X, timesteps, axis=0)[::hop]
+    return windows.transpose(0, 2, 1)
+
+def sequence_metadata(df_common, timesteps, hop):
+    """video_id, window_id, start_frame and end_frame of every sequence.
+
+    `df_common` holds the aligned key rows (video_id, frame, window_id); a
+    sequence belongs to the window of its last frame.
+    """
+    starts = sequence_starts(len(df_common), timesteps, hop)
+    ends = starts + timesteps - 1
+    frames = df_common['frame'].to_numpy()
+    return pd.DataFrame({
+        'video_id': df_common['video_id'].to_numpy()[ends],
+        'window_id': df_common['window_id'].to_numpy()[ends],
+        'start_frame': frames[starts],
+        'end_frame': frames[ends]
+    })
@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+
+# Measures how long ensambleModelRun takes to import (when the server could
+# bind its port) and to have its models ready, plus peak memory, each in a
+# fresh interpreter. Run it after changes to catch startup regressions.
+# Usage: python startup_timing.py [keras|tflite] [quantization]
+
+_CHILD = """
+import json, resource, time
+t = time.perf_counter()
+import ensambleModelRun
+imported = time.perf_counter() - t
+ensambleModelRun.get_ensemble_engine()
+ready = time.perf_counter() - t
+print(json.dumps({
+    "import_seconds": round(imported, 3),
+    "ready_seconds": round(ready, 3),
+    "model_load_seconds": ensambleModelRun.startup_timings.get("model_load_seconds"),
+    "warmup_seconds": ensambleModelRun.startup_timings.get("warmup_seconds"),
+    "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+}))
+"""
+
+
+def measure_startup(backend="keras", quantization=None):
+    env = dict(os.environ, ENSEMBLE_BACKEND=backend, TFLITE_QUANTIZATION=quantization or "")
+    out = subprocess.run([sys.executable, "-c", _CHILD], env=env, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    return dict({"backend": backend, "quantization": quantization}, **result)
+
+
+if __name__ == '__main__':
+    backend = sys.argv[1] if len(sys.argv) > 1 else "keras"
+    quantization = sys.argv[2] if len(sys.argv) > 2 else None
+    print(json.dumps(measure_startup(backend, quantization), indent=2))
@@ -0,0 +1,85 @@
+import numpy as np
+from ensambleModelRun import (
+    TIMESTEPS, HOP, VOTE_TYPE, backends, weights_motion,
+    predict_all_models, ensemble_predictions
+)
+
+
+class StreamingEnsemble:
+    """Scores GRU sequences while the video is still being extracted.
+
+    Feed it the extraction state after every frame (see
+    allModelspreprocess.iter_extraction). It keeps the frames that all three
+    backends have detected, in order, and as soon as TIMESTEPS of them are
+    available it scores the sequence and returns one record per new window,
+    matching the rows of ensemble_predictions_with_ids.csv.
+    """
+
+    def __init__(self, to_features, window_size, video_id=1):
+        self.to_features = to_features
+        self.window_size = window_size
+        self.video_id = video_id
+        self.cursors = {name: 0 for name in backends}
+        self.aligned_frames = []
+        self.aligned_rows = {name: [] for name in backends}
+        self.next_start = 0
+        self.emitted_windows = set()
+
+    def _align(self, buffers):
+        # Each buffer holds increasing frame numbers, so the common frames are
+        # found by advancing the cursors that point at the smallest frame.
+        while all(self.cursors[name] < len(buffers[name]) for name in backends):
+            frames = {name: buffers[name].frames[self.cursors[name]] for name in backends}
+            target = max(frames.values())
+            if all(frame == target for frame in frames.values()):
+                self.aligned_frames.append(int(target))
+                for name in backends:
+                    self.aligned_rows[name].append(self.cursors[name])
+                    self.cursors[name] += 1
+            else:
+                for name in backends:
+                    if frames[name] < target:
+                        self.cursors[name] += 1
+
+    def update(self, state):
+        self._align(state["buffers"])
+
+        starts = []
+        while self.next_start + TIMESTEPS <= len(self.aligned_frames):
+            starts.append(self.next_start)
+            self.next_start += HOP
+        if not starts:
+            return []
+
+        X_tests = {}
+        for name in backends:
+            buffer = state["buffers"][name]
+            sequences = []
+            for start in starts:
+                rows = self.aligned_rows[name][start:start + TIMESTEPS]
+                sequences.append(self.to_features(name, buffer.keypoints[rows], state))
+            X_tests[name] = np.stack(sequences)
+
+        predictions = predict_all_models(X_tests)
+        movement_pred, knee_pred, elbow_pred = ensemble_predictions(predictions, weights=weights_motion, vote_type=VOTE_TYPE)
+
+        records = []
+        for i, start in enumerate(starts):
+            end_frame = self.aligned_frames[start + TIMESTEPS - 1]
+            window_id = end_frame // self.window_size
+            # like the batch path, only the first sequence ending in a window
+            # counts unless the sequences overlap
+            if HOP >= TIMESTEPS:
+                if window_id in self.emitted_windows:
+                    continue
+                self.emitted_windows.add(window_id)
+            records.append({
+                'video_id': self.video_id,
+                'window_id': window_id,
+                'start_frame': self.aligned_frames[start],
+                'end_frame': end_frame,
+                'movement_prediction': float(movement_pred[i]),
+                'knee_prediction': int(knee_pred[i]),
+                'elbow_prediction': int(elbow_pred[i])
+            })
+        return records
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+from frame_alignment import KEY_COLUMNS, align_frames, gather_features
+
+
+# frame_alignment.py against the chained pd.merge it replaced, on random
+# backend tables with missing frames and a few window_id disagreements.
+
+BACKENDS = ['yolo', 'movenet', 'mediapipe']
+
+
+def chained_merge(dfs):
+    """The previous alignment: an inner join of the key columns, backend by backend."""
+    key_frames = []
+    for name, df in dfs.items():
+        key_frame = df[KEY_COLUMNS].copy()
+        key_frame[f'{name}_row'] = np.arange(len(df))
+        key_frames.append(key_frame)
+    merged = key_frames[0]
+    for key_frame in key_frames[1:]:
+        merged = merged.merge(key_frame, on=KEY_COLUMNS)
+    return merged.sort_values(['video_id', 'frame']).reset_index(drop=True)
+
+def backend_table(rng, videos=(1, 2, 5), n_frames=200, keep=0.8, window_size=60):
+    parts = []
+    for video_id in videos:
+        frames = np.flatnonzero(rng.random(n_frames) < keep)
+        parts.append(pd.DataFrame({'video_id': video_id, 'frame': frames, 'window_id': frames // window_size}))
+    df = pd.concat(parts, ignore_index=True)
+    # rows do not have to arrive in order
+    return df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+
+def key_arrays(dfs):
+    return {name: {column: df[column].to_numpy() for column in KEY_COLUMNS} for name, df in dfs.items()}
+
+
+def test_align_frames_matches_chained_merge():
+    rng = np.random.default_rng(0)
+    dfs = {name: backend_table(rng) for name in BACKENDS}
+    # a backend that puts some frames in another window must lose them
+    mismatched = dfs['movenet'].sample(20, random_state=1).index
+    dfs['movenet'].loc[mismatched, 'window_id'] += 1
+
+    rows, df_common = align_frames(key_arrays(dfs))
+    expected = chained_merge(dfs)
+
+    pd.testing.assert_frame_equal(df_common.reset_index(drop=True), expected[KEY_COLUMNS], check_dtype=False)
+    for name in BACKENDS:
+        np.testing.assert_array_equal(rows[name], expected[f'{name}_row'].to_numpy())
+
+def test_gather_features_matches_merged_rows():
+    rng = np.random.default_rng(1)
+    dfs = {name: backend_table(rng) for name in BACKENDS}
+    features = {name: rng.random((len(df), 24)) for name, df in dfs.items()}
+
+    rows, _ = align_frames(key_arrays(dfs))
+    expected = chained_merge(dfs)
+
+    for name in BACKENDS:
+        X = gather_features(features[name], rows[name])
+        assert X.dtype == np.float32
+        np.testing.assert_array_equal(X, features[name][expected[f'{name}_row'].to_numpy()].astype(np.float32))
+
+def test_no_common_frames():
+    dfs = {
+        'yolo': pd.DataFrame({'video_id': [1, 1], 'frame': [0, 1], 'window_id': [0, 0]}),
+        'movenet': pd.DataFrame({'video_id': [1, 1], 'frame': [2, 3], 'window_id': [0, 0]}),
+        'mediapipe': pd.DataFrame({'video_id': [2], 'frame': [0], 'window_id': [0]})
+    }
+    rows, df_common = align_frames(key_arrays(dfs))
+    assert len(df_common) == 0
+    assert all(len(r) == 0 for r in rows.values())
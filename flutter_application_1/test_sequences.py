@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sequences import sequence_metadata, sequence_views, source_rate
+
+
+# sequences.py against the loop it replaced, and source_rate on a toy video
+# sampled with video_decoder's stride.
+
+WINDOW_SIZE = 60
+
+
+def loop_sequences(X, timesteps, step):
+    """The previous create_sequences_sampled: one copied slice per sequence."""
+    sequences = []
+    for i in range(0, len(X) - timesteps + 1, step):
+        sequences.append(X[i:i + timesteps])
+    return np.array(sequences)
+
+def sampled_frames(n_frames, stride):
+    """Frame numbers video_decoder.decode_frames keeps for a stride."""
+    frames, next_sample = [], 0.0
+    for frame in range(n_frames):
+        if frame >= next_sample - 1e-6:
+            frames.append(frame)
+            next_sample += stride
+    return np.array(frames)
+
+def toy_video(frames, video_id=1):
+    """Key rows and features that are linear in the frame number, so interpolation is exact."""
+    df = pd.DataFrame({'video_id': video_id, 'frame': frames, 'window_id': frames // WINDOW_SIZE})
+    X = np.stack([frames * 0.5, frames * -0.25 + 3.0, np.ones(len(frames))], axis=1).astype(np.float32)
+    return df, X
+
+
+@pytest.mark.parametrize("timesteps, hop", [(30, 30), (30, 5), (30, 1), (7, 3)])
+def test_sequence_views_match_loop(timesteps, hop):
+    X = np.random.default_rng(0).random((100, 24), dtype=np.float32)
+    views = sequence_views(X, timesteps, hop)
+    np.testing.assert_array_equal(views, loop_sequences(X, timesteps, hop))
+    assert np.shares_memory(views, X)
+
+def test_sequence_views_shorter_than_timesteps():
+    views = sequence_views(np.zeros((10, 24), dtype=np.float32), 30, 30)
+    assert views.shape == (0, 30, 24)
+
+def test_sequence_metadata_uses_last_frame_window():
+    df, _ = toy_video(np.arange(200))
+    meta = sequence_metadata(df, 30, 30)
+    # the previous code took the window of every STEP-th frame from TIMESTEPS - 1
+    np.testing.assert_array_equal(meta['window_id'], df['window_id'].iloc[29::30].to_numpy())
+    np.testing.assert_array_equal(meta['end_frame'] - meta['start_frame'], 29)
+
+
+def test_source_rate_full_rate_is_unchanged():
+    df, X = toy_video(np.arange(120))
+    X_tests = {'yolo': X}
+    X_out, df_out = source_rate(X_tests, df, stride=1.0)
+    assert X_out is X_tests and df_out is df
+
+@pytest.mark.parametrize("stride", [3.0, 2.5])
+def test_source_rate_restores_sampled_video(stride):
+    full_df, full_X = toy_video(np.arange(120))
+    frames = sampled_frames(120, stride)
+    df, X = toy_video(frames)
+
+    X_full, df_full = source_rate({'yolo': X, 'movenet': X * 2}, df, stride=stride, window_size=WINDOW_SIZE)
+
+    last = frames[-1]
+    np.testing.assert_array_equal(df_full['frame'], np.arange(last + 1))
+    np.testing.assert_array_equal(df_full['window_id'], full_df['window_id'][:last + 1])
+    np.testing.assert_allclose(X_full['yolo'], full_X[:last + 1], rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(X_full['movenet'], full_X[:last + 1] * 2, rtol=1e-5, atol=1e-5)
+
+def test_source_rate_leaves_dropouts_unfilled():
+    frames = sampled_frames(240, 3.0)
+    # no pose detected from frame 60 to 180
+    frames = frames[(frames < 60) | (frames > 180)]
+    df, X = toy_video(frames)
+
+    _, df_full = source_rate({'yolo': X}, df, stride=3.0)
+
+    kept = df_full['frame'].to_numpy()
+    assert not ((kept > 57) & (kept < 183)).any()
+    np.testing.assert_array_equal(kept[kept <= 57], np.arange(58))
+    np.testing.assert_array_equal(kept[kept >= 183], np.arange(183, frames[-1] + 1))
+
+def test_source_rate_keeps_videos_apart():
+    df_a, X_a = toy_video(sampled_frames(30, 3.0), video_id=1)
+    df_b, X_b = toy_video(sampled_frames(30, 3.0), video_id=2)
+    df = pd.concat([df_a, df_b], ignore_index=True)
+
+    X_full, df_full = source_rate({'yolo': np.concatenate([X_a, X_b])}, df, stride=3.0)
+
+    for video_id in (1, 2):
+        np.testing.assert_array_equal(df_full.loc[df_full['video_id'] == video_id, 'frame'], np.arange(28))
+    np.testing.assert_allclose(X_full['yolo'][:28], X_full['yolo'][28:])
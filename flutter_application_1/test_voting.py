@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from voting import vote
+
+
+# voting.py against the per-model loops and scipy-style majority vote it
+# replaced (see benchmark_voting.py for the timings).
+
+
+def random_outputs(rng, n_models, n_sequences, n_classes):
+    preds = {}
+    for i in range(n_models):
+        outputs = {'movement': rng.random(n_sequences, dtype=np.float32)}
+        for head in ('knee', 'elbow'):
+            probs = rng.dirichlet(np.ones(n_classes), n_sequences).astype(np.float32)
+            outputs[f'{head}_probs'] = probs
+            outputs[head] = probs.argmax(axis=1)
+        preds[f"model_{i}"] = outputs
+    return preds
+
+def stacked(preds, head):
+    return np.array([outputs[head] for outputs in preds.values()])
+
+def majority_loop(labels):
+    """scipy.stats.mode over the models: most votes, ties to the lowest class."""
+    return np.array([np.bincount(column).argmax() for column in labels.T])
+
+
+@pytest.mark.parametrize("n_models, n_sequences", [(3, 1), (3, 500), (8, 200)])
+def test_hard_vote_matches_majority(n_models, n_sequences):
+    rng = np.random.default_rng(n_models)
+    preds = random_outputs(rng, n_models, n_sequences, n_classes=3)
+    weights = rng.random(n_models)
+
+    movement, knee, elbow = vote(preds, weights, 'hard')
+
+    np.testing.assert_allclose(movement, np.average(stacked(preds, 'movement'), axis=0, weights=weights), rtol=1e-5)
+    np.testing.assert_array_equal(knee, majority_loop(stacked(preds, 'knee')))
+    np.testing.assert_array_equal(elbow, majority_loop(stacked(preds, 'elbow')))
+
+def test_weighted_vote_matches_threshold():
+    rng = np.random.default_rng(0)
+    preds = random_outputs(rng, 3, 500, n_classes=2)
+    class_weights = {name: {'knee': w_knee, 'elbow': w_elbow}
+                     for name, w_knee, w_elbow in zip(preds, rng.random(3), rng.random(3))}
+
+    _, knee, elbow = vote(preds, None, 'weighted', class_weights)
+
+    for head, voted in (('knee', knee), ('elbow', elbow)):
+        w = [class_weights[name][head] for name in preds]
+        # the previous rule for the binary heads: weighted share of class 1 above one half
+        expected = (np.average(stacked(preds, head), axis=0, weights=w) > 0.5).astype(int)
+        np.testing.assert_array_equal(voted, expected)
+
+def test_weighted_vote_needs_class_weights():
+    preds = random_outputs(np.random.default_rng(0), 3, 10, n_classes=2)
+    with pytest.raises(ValueError):
+        vote(preds, None, 'weighted')
+
+@pytest.mark.parametrize("use_class_weights", [False, True])
+def test_soft_vote_matches_averaged_probabilities(use_class_weights):
+    rng = np.random.default_rng(2)
+    preds = random_outputs(rng, 3, 300, n_classes=3)
+    class_weights = None
+    if use_class_weights:
+        class_weights = {name: {'knee': rng.random(), 'elbow': rng.random()} for name in preds}
+
+    _, knee, elbow = vote(preds, None, 'soft', class_weights)
+
+    for head, voted in (('knee', knee), ('elbow', elbow)):
+        w = [class_weights[name][head] for name in preds] if use_class_weights else None
+        expected = np.average(stacked(preds, f'{head}_probs'), axis=0, weights=w).argmax(axis=1)
+        np.testing.assert_array_equal(voted, expected)
@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+import numpy as np
+import metrics
+
+# The standalone runtime is enough to serve the converted GRUs and avoids
+# importing all of TensorFlow; fall back to the copy bundled with TensorFlow.
+try:
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    from tensorflow.lite import Interpreter
+
+
+def flex_interpreter_class():
+    """Interpreter for models exported with Select TF ops.
+
+    Only the TensorFlow build links the Flex delegate those ops need;
+    tflite_runtime cannot run them.
+    """
+    try:
+        import tensorflow as tf
+    except ImportError:
+        raise RuntimeError("This TFLite model was exported with Select TF ops (needs_flex_ops) and "
+                           "needs the full tensorflow package; tflite_runtime cannot load it") from None
+    return tf.lite.Interpreter
+
+def tflite_path(name, quantization=None):
+    suffix = f"_{quantization}" if quantization else ""
+    return f"models/best_{name}_infant_movement_model{suffix}.tflite"
+
+
+class TFLiteModel:
+    """One exported GRU, returning (movement, knee_probs, elbow_probs) like Keras."""
+
+    def __init__(self, model_path, num_threads=None):
+        with open(model_path + ".json") as f:
+            meta = json.load(f)
+        self.output_order = meta["output_order"]
+        self.output_shapes = [tuple(shape) for shape in meta["output_shapes"]]
+
+        interpreter_class = flex_interpreter_class() if meta.get("needs_flex_ops") else Interpreter
+        self.interpreter = interpreter_class(model_path=model_path, num_threads=num_threads)
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_indices = [d['index'] for d in self.interpreter.get_output_details()]
+        self.batch_size = None
+        self._lock = threading.Lock()
+
+    def predict(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        with self._lock:
+            if self.batch_size != len(X):
+                self.interpreter.resize_tensor_input(self.input_index, X.shape)
+                self.interpreter.allocate_tensors()
+                self.batch_size = len(X)
+            self.interpreter.set_tensor(self.input_index, X)
+            self.interpreter.invoke()
+            outputs = [self.interpreter.get_tensor(i) for i in self.output_indices]
+        return tuple(outputs[i] for i in self.output_order)
+
+
+class TFLiteEnsemble:
+    """Drop-in replacement for FusedEnsemble backed by the exported .tflite files."""
+
+    def __init__(self, names, quantization=None, batch_size=256, num_threads=None):
+        self.names = list(names)
+        self.batch_size = batch_size
+        self.models = {name: TFLiteModel(tflite_path(name, quantization), num_threads) for name in self.names}
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def _record(self, batch_size, seconds):
+        metrics.gru_batch_seconds.observe(seconds, engine="tflite")
+        metrics.gru_batch_sequences.inc(batch_size, engine="tflite")
+        with self._lock:
+            s = self.stats.setdefault(batch_size, {"calls": 0, "sequences": 0, "seconds": 0.0})
+            s["calls"] += 1
+            s["sequences"] += batch_size
+            s["seconds"] += seconds
+
+    def predict_raw(self, X_tests):
+        results = {}
+        for name in self.names:
+            X = X_tests[name]
+            chunks = []
+            for start in range(0, len(X), self.batch_size):
+                t0 = time.perf_counter()
+                chunks.append(self.models[name].predict(X[start:start + self.batch_size]))
+                self._record(len(chunks[-1][0]), time.perf_counter() - t0)
+            if chunks:
+                results[name] = tuple(np.concatenate([c[i] for c in chunks]) for i in range(3))
+            else:
+                results[name] = tuple(np.zeros((0,) + shape, dtype=np.float32)
+                                      for shape in self.models[name].output_shapes)
+        return results
+
+    def report(self):
+        with self._lock:
+            return {
+                batch_size: {
+                    "calls": s["calls"],
+                    "mean_latency_ms": round(1000 * s["seconds"] / s["calls"], 3),
+                    "sequences_per_sec": round(s["sequences"] / s["seconds"], 1) if s["seconds"] else None
+                }
+                for batch_size, s in sorted(self.stats.items())
+            }
@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+import cv2
+import metrics
+
+# Video decoding for the extractors. decode_frames() reads inline, on the
+# caller's thread; ThreadedDecoder runs the same loop on a background thread
+# and prefetches into a bounded queue, so decoding the next frames overlaps
+# with inference on the current one.
+
+# Frames decoded ahead of the consumer. Each 1080p BGR frame is ~6 MB.
+PREFETCH_FRAMES = 8
+
+# Ask FFmpeg for hardware-accelerated decoding when OpenCV supports it; falls
+# back to software decoding otherwise. Off by default: hardware decoders may
+# convert colours differently, which changes the keypoints and every
+# prediction after them. Check the keypoint_max_diff column of
+# benchmark_decode.py on the target machine before turning it on.
+HW_ACCELERATION = False
+
+
+def open_capture(video_path, hw_acceleration=HW_ACCELERATION):
+    if hw_acceleration and hasattr(cv2, "CAP_PROP_HW_ACCELERATION"):
+        cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG,
+                               [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+        if cap.isOpened():
+            return cap
+        cap.release()
+    return cv2.VideoCapture(video_path)
+
+def sample_stride(source_fps, target_fps=None):
+    """Source frames from one sampled frame to the next (1.0 = every frame)."""
+    return source_fps / target_fps if target_fps and target_fps < source_fps else 1.0
+
+def video_sample_stride(video_path, target_fps=None):
+    """sample_stride() for a video file, read from its container header."""
+    if not target_fps:
+        return 1.0
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return sample_stride(cap.get(cv2.CAP_PROP_FPS) or 30.0, target_fps)
+    finally:
+        cap.release()
+
+def decode_frames(video_path, target_fps=None, downscale=None, hw_acceleration=HW_ACCELERATION):
+    """Yield (frame_index, frame, (width, height), timestamp_ms) for every sampled frame.
+
+    Runs at most `target_fps` frames per second of video through (None = all);
+    skipped frames are only grabbed, not converted. The frame is already
+    resized by `downscale`; the size is that of the source frame, the index
+    counts every source frame and the timestamp is CAP_PROP_POS_MSEC.
+    """
+    cap = open_capture(video_path, hw_acceleration)
+    decode_time = 0.0
+    decoded = 0
+    try:
+        source_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        stride = sample_stride(source_fps, target_fps)
+        next_sample = 0.0
+        frame_index = 0
+
+        while cap.isOpened():
+            start = time.perf_counter()
+            if frame_index < next_sample - 1e-6:
+                # grab() advances the stream without converting the frame
+                ok = cap.grab()
+                decode_time += time.perf_counter() - start
+                if not ok:
+                    break
+                frame_index += 1
+                continue
+            next_sample += stride
+
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timestamp_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+            height, width, _ = frame.shape
+            if downscale and downscale != 1.0:
+                frame = cv2.resize(frame, None, fx=downscale, fy=downscale, interpolation=cv2.INTER_AREA)
+            decode_time += time.perf_counter() - start
+            decoded += 1
+
+            yield frame_index, frame, (width, height), timestamp_ms
+            frame_index += 1
+    finally:
+        cap.release()
+        metrics.decode_seconds.inc(decode_time)
+        metrics.decoded_frames.inc(decoded)
+
+
+class ThreadedDecoder:
+    """Iterate decode_frames() items produced on a background thread.
+
+    The queue is bounded by `prefetch`, so the decoder never runs more than
+    that many frames ahead. Downscaling also happens on the decoder thread.
+    Use as a context manager (or call close()) to stop the thread early.
+    """
+
+    _END = object()
+
+    def __init__(self, video_path, target_fps=None, downscale=None, prefetch=PREFETCH_FRAMES,
+                 hw_acceleration=HW_ACCELERATION):
+        self._queue = queue.Queue(maxsize=prefetch)
+        self._stop = threading.Event()
+        self._error = None
+        self.decode_seconds = 0.0
+        self.frames = 0
+        self._thread = threading.Thread(
+            target=self._run, args=(video_path, target_fps, downscale, hw_acceleration),
+            daemon=True, name="video-decoder"
+        )
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, video_path, target_fps, downscale, hw_acceleration):
+        frames = decode_frames(video_path, target_fps, downscale, hw_acceleration)
+        try:
+            while True:
+                start = time.perf_counter()
+                item = next(frames, None)
+                self.decode_seconds += time.perf_counter() - start
+                if item is None or not self._put(item):
+                    break
+                self.frames += 1
+        except Exception as e:
+            self._error = e
+        finally:
+            frames.close()
+            self._put(self._END)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._END:
+                if self._error is not None:
+                    raise self._error
+                return
+            yield item
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
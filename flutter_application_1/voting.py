@@ -0,0 +1,82 @@
+import numpy as np
+
+
+# Ensemble voting over any number of models, in plain NumPy. The per-model
+# outputs are stacked once into (models, sequences[, classes]) arrays and every
+# vote is a weighted reduction over the model axis, so a batch holding the
+# sequences of many videos costs the same handful of array operations as one.
+#   hard      each model votes for its argmax class; ties go to the lowest
+#             class, like scipy.stats.mode
+#   weighted  hard voting with per-model weights for each head
+#   soft      weighted average of the class probabilities, then argmax
+
+VOTE_TYPES = ('hard', 'weighted', 'soft')
+CLASS_HEADS = ('knee', 'elbow')
+
+
+def model_weights(names, weights=None):
+    """Weights as an array in the order of `names`; equal weights by default.
+
+    `weights` may be a sequence in that order or a dict keyed by model name.
+    """
+    if weights is None:
+        return np.full(len(names), 1.0 / len(names))
+    if isinstance(weights, dict):
+        weights = [weights[name] for name in names]
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.shape != (len(names),):
+        raise ValueError(f"Expected {len(names)} weights, got {weights.shape}")
+    return weights
+
+def stack_outputs(preds, head):
+    """(models, sequences[, classes]) array of one output head."""
+    return np.stack([np.asarray(outputs[head]) for outputs in preds.values()])
+
+def hard_vote(labels, weights, n_classes):
+    """Weighted count of (models, sequences) labels per class, then argmax."""
+    one_hot = labels[..., None] == np.arange(n_classes)
+    votes = np.einsum('m,mnc->nc', weights, one_hot.astype(np.float64))
+    return votes.argmax(axis=1)
+
+def soft_vote(probs, weights):
+    """Weighted mean of (models, sequences, classes) probabilities, then argmax."""
+    return np.einsum('m,mnc->nc', weights, probs).argmax(axis=1)
+
+def vote(preds, weights=None, vote_type='hard', class_weights=None):
+    """Returns (movement, knee, elbow) arrays with one value per sequence.
+
+    `preds` maps model name to the outputs of ensambleModelRun.predict_all_models:
+    'movement', plus '<head>_probs' (and '<head>' labels) for the class heads.
+    Movement is always the weighted mean over the models. `class_weights`
+    ({model: {'knee': w, 'elbow': w}}) weighs the class heads; it is required
+    for weighted voting and optional for soft voting.
+    """
+    if vote_type not in VOTE_TYPES:
+        raise ValueError(f"vote_type must be one of {VOTE_TYPES}")
+    names = list(preds)
+    movement_weights = model_weights(names, weights)
+    movement = movement_weights @ stack_outputs(preds, 'movement').reshape(len(names), -1) / movement_weights.sum()
+
+    heads = []
+    for head in CLASS_HEADS:
+        if class_weights is not None and vote_type != 'hard':
+            head_weights = model_weights(names, {name: class_weights[name][head] for name in names})
+        elif vote_type == 'weighted':
+            raise ValueError("class_weights required for weighted voting")
+        else:
+            head_weights = model_weights(names)
+
+        if f'{head}_probs' in preds[names[0]]:
+            probs = stack_outputs(preds, f'{head}_probs')
+            if vote_type == 'soft':
+                heads.append(soft_vote(probs, head_weights))
+                continue
+            labels, n_classes = probs.argmax(axis=2), probs.shape[2]
+        elif vote_type == 'soft':
+            raise ValueError("soft voting needs the class probabilities")
+        else:
+            labels = stack_outputs(preds, head)
+            n_classes = int(labels.max()) + 1 if labels.size else 1
+        heads.append(hard_vote(labels, head_weights, n_classes))
+
+    return movement, heads[0], heads[1]
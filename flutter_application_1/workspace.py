@@ -0,0 +1,49 @@
+import hashlib
+import os
+import re
+import shutil
+
+
+# Every uploaded video gets its own directory, named after the SHA-256 of its
+# content, which holds the video and every file the pipeline derives from it.
+JOBS_FOLDER = "jobs"
+
+_HASH_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def video_hash(video_path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(video_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def workspace_dir(content_hash, root=JOBS_FOLDER):
+    if not _HASH_RE.fullmatch(content_hash):
+        raise ValueError(f"Invalid workspace id: {content_hash}")
+    return os.path.join(root, content_hash)
+
+def workspace_hash(workspace):
+    """The SHA-256 a workspace is named after, or None for any other directory."""
+    name = os.path.basename(os.path.normpath(workspace))
+    return name if _HASH_RE.fullmatch(name) else None
+
+def create_workspace(video_path, root=JOBS_FOLDER, content_hash=None, extension=None):
+    """Move an uploaded video into its content-addressed workspace.
+
+    Returns (workspace, video_path_in_workspace). Uploading the same bytes
+    twice lands in the same workspace. Pass `content_hash` when the SHA-256
+    is already known, and `extension` to name the file differently from the
+    upload.
+    """
+    content_hash = content_hash or video_hash(video_path)
+    workspace = workspace_dir(content_hash, root)
+    os.makedirs(workspace, exist_ok=True)
+
+    extension = extension or os.path.splitext(video_path)[1].lower()
+    target = os.path.join(workspace, f"video{extension}")
+    if os.path.exists(target):
+        os.remove(video_path)
+    else:
+        shutil.move(video_path, target)
+    return workspace, target